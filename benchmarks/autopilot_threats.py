@@ -0,0 +1,94 @@
+"""Compare the autopilot's per-threat dict loop against the NumPy threat model.
+
+Usage: python benchmarks/autopilot_threats.py [--bullets N ...] [--frames N]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game0 import WIDTH, HEIGHT, AI_PARAMS, Game  # noqa: E402
+
+
+def threats_loop(game, params=AI_PARAMS):
+    # The pre-NumPy threat model from update_ai: a dict per threat, then
+    # Python loops for the counts, the emergency check and the repulsion sum
+    px, py = game.player.pos
+    all_threats = []
+    nearby_bullets = 0
+    nearby_enemies = 0
+    for e in game.enemies:
+        dist = math.hypot(px - e.pos[0], py - e.pos[1])
+        all_threats.append({'pos': e.pos, 'threat': params['enemy_threat'] * e.tier, 'dist': dist})
+        if dist < params['nearby_enemy_radius']:
+            nearby_enemies += 1
+    for a in game.asteroids:
+        dist = math.hypot(px - a.pos[0], py - a.pos[1])
+        all_threats.append({'pos': a.pos, 'threat': params['asteroid_threat'], 'dist': dist})
+    for eb_x, eb_y in game.enemy_bullets.positions():
+        dist = math.hypot(px - eb_x, py - eb_y)
+        all_threats.append({'pos': [eb_x, eb_y], 'threat': params['bullet_threat'], 'dist': dist})
+        if dist < params['nearby_bullet_radius']:
+            nearby_bullets += 1
+    for t in all_threats:
+        if t['dist'] < params['emergency_dodge_radius']:
+            return t
+    steer_vec = [0.0, 0.0]
+    for t in all_threats:
+        if t['dist'] < params['perception_radius']:
+            weight = t['threat'] / (t['dist']**2 + 1)
+            steer_vec[0] += (px - t['pos'][0]) / (t['dist'] + 0.1) * weight
+            steer_vec[1] += (py - t['pos'][1]) / (t['dist'] + 0.1) * weight
+    return steer_vec, nearby_bullets, nearby_enemies
+
+
+def time_calls(call, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        call()
+    return (time.perf_counter() - start) / frames * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bullets', type=int, nargs='+', default=[0, 30, 300, 1000, 3000])
+    parser.add_argument('--frames', type=int, default=500)
+    args = parser.parse_args()
+
+    game = Game(headless=True)
+    game.reset_game(seed=1)
+    game.player.bombs = 0
+    for _ in range(300):
+        game.step()  # Bring in some enemies and asteroids
+    rng = random.Random(1)
+
+    def update_ai():
+        # Keep the loop on cooldown and the heading fixed so every call
+        # evaluates the same situation
+        game.player.last_loop_time = game.clock.get_ticks()
+        game.player.angle = 0
+        game.update_ai()
+
+    print(f"{len(game.enemies)} enemies, {len(game.asteroids)} asteroids")
+    print(f"{'bullets':>8} {'dict loop us':>13} {'update_ai us':>13}")
+    for count in args.bullets:
+        # Bullets in a ring outside the emergency radius, so both paths
+        # evaluate every threat
+        game.enemy_bullets.clear()
+        for _ in range(count):
+            angle = rng.uniform(0, 2 * math.pi)
+            r = rng.uniform(60, 300)
+            game.enemy_bullets.add(WIDTH / 2 + r * math.cos(angle), HEIGHT / 2 + r * math.sin(angle), 0, 0)
+        game.player.pos = [WIDTH / 2, HEIGHT / 2]
+        loop_us = time_calls(lambda: threats_loop(game), args.frames)
+        numpy_us = time_calls(update_ai, args.frames)
+        print(f"{count:>8} {loop_us:>13.1f} {numpy_us:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
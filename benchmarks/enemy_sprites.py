@@ -0,0 +1,66 @@
+"""Compare per-enemy polygon drawing against the pre-rendered enemy atlas.
+
+Usage: python benchmarks/enemy_sprites.py [--enemies N] [--frames N]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame  # noqa: E402
+
+from game0 import WIDTH, HEIGHT, Enemy  # noqa: E402
+
+
+def draw_polygon(enemy, surface):
+    # The pre-atlas Enemy.draw: six trig calls and a polygon fill per enemy
+    color = Enemy.TIER_COLORS[enemy.tier - 1]
+    rad = math.radians(enemy.angle)
+    rotated_points = []
+    for x, y in Enemy.SHIP_POINTS:
+        new_x = x * math.cos(rad) - y * math.sin(rad)
+        new_y = x * math.sin(rad) + y * math.cos(rad)
+        rotated_points.append((enemy.pos[0] + new_x, enemy.pos[1] + new_y))
+    pygame.draw.polygon(surface, color, rotated_points)
+
+
+def time_frames(draw, enemies, surface, frames):
+    start = time.perf_counter()
+    for _ in range(frames):
+        for e in enemies:
+            e.angle += 2.5
+            draw(e, surface)
+    return (time.perf_counter() - start) / frames * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--enemies', type=int, default=200)
+    parser.add_argument('--frames', type=int, default=200)
+    args = parser.parse_args()
+
+    pygame.display.set_mode((WIDTH, HEIGHT))
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    random.seed(0)
+    enemies = [Enemy(random.randint(1, 6)) for _ in range(args.enemies)]
+    for e in enemies:
+        e.pos[:] = random.uniform(0, WIDTH), random.uniform(0, HEIGHT)
+
+    start = time.perf_counter()
+    Enemy.build_atlas()
+    build_ms = (time.perf_counter() - start) * 1e3
+
+    polygon_ms = time_frames(draw_polygon, enemies, surface, args.frames)
+    atlas_ms = time_frames(Enemy.draw, enemies, surface, args.frames)
+    print(f"polygon per frame: {polygon_ms:8.3f} ms  ({args.enemies} enemies)")
+    print(f"atlas per frame  : {atlas_ms:8.3f} ms  (atlas build {build_ms:.1f} ms)")
+    print(f"speedup          : {polygon_ms / atlas_ms:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
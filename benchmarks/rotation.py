@@ -0,0 +1,56 @@
+"""Compare per-frame pygame.transform.rotate against RotatedSpriteCache.
+
+Usage: python benchmarks/rotation.py [--step DEGREES] [--frames N]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame  # noqa: E402
+
+from game0 import WIDTH, HEIGHT, RotatedSpriteCache, load_image  # noqa: E402
+
+
+def time_frames(draw, frames):
+    # Sweep the ship through every heading, like a turning player
+    start = time.perf_counter()
+    for i in range(frames):
+        draw(i * 4.5)
+    return (time.perf_counter() - start) / frames * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--step', type=float, default=2, help='cache angular resolution in degrees')
+    parser.add_argument('--frames', type=int, default=20000)
+    args = parser.parse_args()
+
+    pygame.display.set_mode((WIDTH, HEIGHT))
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    image = pygame.transform.scale(load_image('craft0.png'), (30, 30))
+    center = (WIDTH / 2, HEIGHT / 2)
+
+    def draw_rotate(angle):
+        rotated = pygame.transform.rotate(image, -angle - 90)
+        surface.blit(rotated, rotated.get_rect(center=center))
+
+    start = time.perf_counter()
+    cache = RotatedSpriteCache(image, args.step)
+    warm_ms = (time.perf_counter() - start) * 1e3
+
+    def draw_cached(angle):
+        cache.blit(surface, -angle - 90, center)
+
+    rotate_us = time_frames(draw_rotate, args.frames)
+    cached_us = time_frames(draw_cached, args.frames)
+    print(f"rotate per frame : {rotate_us:8.2f} us")
+    print(f"{f'cache ({args.step:g} deg)':<17}: {cached_us:8.2f} us  ({cache.count} frames, warm-up {warm_ms:.1f} ms)")
+    print(f"speedup          : {rotate_us / cached_us:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
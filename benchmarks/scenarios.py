@@ -0,0 +1,225 @@
+"""Time Game.update, handle_collisions, update_ai and draw in canned game states.
+
+Each scenario builds a Game state from a fixed seed, snapshots it, and then
+plays --frames frames with the autopilot on, restoring the snapshot every
+--reset-every frames so the state never drifts far from what it is meant to
+measure. The player can't die, loop or bomb. update times include the
+handle_collisions and update_ai calls made inside it, which are also timed
+on their own. Allocations are AllocationCounter counts per update.
+
+--save FILE writes the results as a baseline; --baseline FILE compares
+against one and exits with status 1 if any median or p95 time got slower
+by more than --tolerance (and MIN_REGRESSION_US), or allocations went up.
+
+Usage: python benchmarks/scenarios.py [--scenarios NAME ...] [--frames N]
+                                      [--reset-every N] [--save FILE]
+                                      [--baseline FILE] [--tolerance F]
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game0 import WIDTH, HEIGHT, BOSS_HP, ENEMY_BULLET_SPEED, FPS, Boss, Game  # noqa: E402
+
+PHASES = ('update', 'handle_collisions', 'update_ai', 'draw')
+FOREVER = 1 << 60  # Clock time that is never reached
+MIN_REGRESSION_US = 20.0  # Smaller slowdowns are timer noise, whatever the ratio
+
+
+def empty_field(game, rng):
+    pass
+
+
+def stage5_wave(game, rng):
+    # Twenty seconds of stage 5 spawning, tier mix included
+    game.stage = 5
+    game.low_tier_enemy_destroyed = True
+    for _ in range(FPS * 20):
+        game.step()
+
+
+def boss_ring(game, rng):
+    # A phase 3 boss with ten rings of its circular pattern in flight
+    game.boss = Boss()
+    game.boss.hp = BOSS_HP // 4
+    game.boss.phase = 3
+    now = game.clock.get_ticks()
+    bx, by = game.boss.pos
+    for ring in range(10):
+        r = 20 + ring * 18
+        for i in range(8):
+            angle = 2 * math.pi / 8 * i + ring * 0.3
+            game.enemy_bullets.add(bx + r * math.cos(angle), by + r * math.sin(angle),
+                                   ENEMY_BULLET_SPEED * math.cos(angle), ENEMY_BULLET_SPEED * math.sin(angle),
+                                   6, now)
+
+
+def post_bomb(game, rng):
+    # 80 enemies and 400 bullets, then a bomb: explosions and bursts everywhere
+    add_enemies(game, rng, 80)
+    add_bullets(game, rng, 400)
+    game.player.bombs = 1
+    game.detonate_bomb(game.clock.get_ticks())
+
+
+def bullets_5000(game, rng):
+    add_bullets(game, rng, 5000)
+
+
+def enemies_500(game, rng):
+    add_enemies(game, rng, 500)
+
+
+SCENARIOS = {
+    'empty': empty_field,
+    'stage5_wave': stage5_wave,
+    'boss_phase3_ring': boss_ring,
+    'post_bomb_storm': post_bomb,
+    'bullets_5000': bullets_5000,
+    'enemies_500': enemies_500,
+}
+
+
+def add_enemies(game, rng, count):
+    for _ in range(count):
+        e = game.enemy_pool.acquire(rng.choice([1, 2, 3, 4, 5, 6]), rng=game.streams.enemy)
+        e.pos[:] = rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT)
+        game.enemies.append(e)
+
+
+def add_bullets(game, rng, count):
+    now = game.clock.get_ticks()
+    for _ in range(count):
+        angle = rng.uniform(0, 2 * math.pi)
+        game.enemy_bullets.add(rng.uniform(0, WIDTH), rng.uniform(0, HEIGHT),
+                               ENEMY_BULLET_SPEED * math.cos(angle), ENEMY_BULLET_SPEED * math.sin(angle),
+                               1, now)
+
+
+def build(name):
+    game = Game(headless=True)
+    game.reset_game(seed=1)
+    game.ai_enabled = True
+    game.boss_defeated_count = 1000  # No boss spawns part way
+    player = game.player
+    player.invincible_until = FOREVER
+    player.last_loop_time = FOREVER
+    player.bombs = 0
+    SCENARIOS[name](game, random.Random(1))
+    return game
+
+
+def timed(game, name, times):
+    # Replace a Game method on the instance with one adding its time to times
+    method = getattr(game, name)
+
+    def wrapper(*args):
+        start = time.perf_counter()
+        result = method(*args)
+        times[name] += time.perf_counter() - start
+        return result
+
+    setattr(game, name, wrapper)
+
+
+def run(name, frames, reset_every):
+    game = build(name)
+    saved = game.snapshot()
+    entities = (len(game.enemies), game.enemy_bullets.count,
+                game.explosions.count + game.engine_particles.count)
+    times = dict.fromkeys(PHASES, 0.0)
+    timed(game, 'handle_collisions', times)
+    timed(game, 'update_ai', times)
+    samples = {phase: [] for phase in PHASES}
+    allocations = []
+    for frame in range(-reset_every, frames):  # One unmeasured round to warm caches and pools
+        if frame % reset_every == 0:
+            game.restore(saved)
+            game.allocations.current = 0  # Restoring isn't part of the measured frames
+        for phase in PHASES:
+            times[phase] = 0.0
+        start = time.perf_counter()
+        game.update()
+        times['update'] = time.perf_counter() - start
+        start = time.perf_counter()
+        game.draw()
+        times['draw'] = time.perf_counter() - start
+        game.clock.tick(FPS)
+        if frame < 0:
+            continue
+        for phase in PHASES:
+            samples[phase].append(times[phase] * 1e6)
+        allocations.append(game.allocations.last_frame)
+    result = {'entities': dict(zip(('enemies', 'enemy_bullets', 'particles'), entities))}
+    for phase in PHASES:
+        us = np.array(samples[phase])
+        result[phase] = {q: round(float(np.percentile(us, p)), 1)
+                         for q, p in (('median', 50), ('p95', 95), ('p99', 99))}
+    result['allocations'] = {'mean': round(float(np.mean(allocations)), 2), 'max': int(max(allocations))}
+    return result
+
+
+def regressions(results, baseline, tolerance):
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for phase in PHASES:
+            for q in ('median', 'p95'):
+                now, before = result[phase][q], base[phase][q]
+                if now > before * (1 + tolerance) and now - before > MIN_REGRESSION_US:
+                    failures.append(f"{name} {phase} {q}: {now:.1f} us vs. {before:.1f} us baseline "
+                                    f"(+{100 * (now / before - 1):.0f}%)")
+        now, before = result['allocations']['mean'], base['allocations']['mean']
+        if now > before + 0.05:
+            failures.append(f"{name} allocations: {now:.2f} per frame vs. {before:.2f} baseline")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--reset-every', type=int, default=30, metavar='N', help='restore the scenario every N frames')
+    parser.add_argument('--save', metavar='FILE', help='write the results as a baseline')
+    parser.add_argument('--baseline', metavar='FILE', help='fail if slower than this baseline')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='allowed slowdown, as a fraction')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'scenario':<17} {'phase':<18} {'median us':>10} {'p95 us':>9} {'p99 us':>9}")
+    for name in args.scenarios:
+        result = results[name] = run(name, args.frames, args.reset_every)
+        for phase in PHASES:
+            t = result[phase]
+            print(f"{name:<17} {phase:<18} {t['median']:>10.1f} {t['p95']:>9.1f} {t['p99']:>9.1f}")
+        counts = '  '.join(f"{k} {v}" for k, v in result['entities'].items())
+        print(f"{name:<17} {'allocations':<18} {result['allocations']['mean']:>10.2f} "
+              f"{'max':>9} {result['allocations']['max']:>4}   ({counts})")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = regressions(results, json.load(f), args.tolerance)
+        if failures:
+            print(f"\nREGRESSION against {args.baseline}:")
+            for failure in failures:
+                print(f"  {failure}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
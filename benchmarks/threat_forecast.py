@@ -0,0 +1,73 @@
+"""Time ThreatForecast.predict() against its per-frame budget.
+
+Each row adds N enemy bullets around the player, a quarter of them homing,
+and moves them for --frames frames, forecasting every frame. The stepped
+column is the mean number of homing bullets and enemies simulated frame by
+frame; the rest are solved in closed form.
+
+Usage: python benchmarks/threat_forecast.py [--bullets N ...] [--frames N]
+"""
+import argparse
+import math
+import os
+import random
+import sys
+
+import numpy as np
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from game0 import WIDTH, HEIGHT, ENEMY_BULLET_SPEED, Game, ThreatForecast  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bullets', type=int, nargs='+', default=[0, 10, 30, 100, 300, 1000])
+    parser.add_argument('--frames', type=int, default=300)
+    args = parser.parse_args()
+
+    game = Game(headless=True)
+    game.reset_game(seed=1)
+    for _ in range(300):
+        game.step()  # Bring in some enemies and asteroids
+    rng = random.Random(1)
+    player = game.player
+    player.pos = [WIDTH / 2, HEIGHT / 2]
+    player.angle = 30
+    player.thrust = 2.0
+
+    budget = ThreatForecast().budget_us
+    print(f"{len(game.enemies)} enemies, {len(game.asteroids)} asteroids, budget {budget} us")
+    print(f"{'bullets':>8} {'stepped':>8} {'median us':>10} {'p95 us':>8} {'max us':>8} {'over %':>7}")
+    for count in args.bullets:
+        bullets = game.enemy_bullets
+        bullets.clear()
+        for i in range(count):
+            # Bullets in a ring, aimed roughly at the player
+            angle = rng.uniform(0, 2 * math.pi)
+            r = rng.uniform(40, 250)
+            aim = angle + math.pi + rng.uniform(-0.5, 0.5)
+            bullets.add(player.pos[0] + r * math.cos(angle), player.pos[1] + r * math.sin(angle),
+                        ENEMY_BULLET_SPEED * math.cos(aim), ENEMY_BULLET_SPEED * math.sin(aim),
+                        tier=4 if i % 4 == 0 else 1, birth=game.clock.get_ticks())
+        ring = bullets.pack()
+        forecast = ThreatForecast()
+        timings = []
+        stepped = 0
+        for _ in range(args.frames):
+            forecast.predict(player, game.enemies, game.asteroids, bullets, game.clock.get_ticks())
+            timings.append(forecast.last_us)
+            stepped += forecast.stepped
+            bullets.update(game.clock.get_ticks(), player.pos)
+            if bullets.count < count / 2:
+                # Most have flown off or reached the player; start the ring over
+                bullets.unpack(ring, 0)
+        timings = np.array(timings)
+        print(f"{count:>8} {stepped / args.frames:>8.1f} {np.median(timings):>10.1f} "
+              f"{np.percentile(timings, 95):>8.1f} {timings.max():>8.1f} "
+              f"{100 * forecast.over_budget / forecast.runs:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Distill the reactive autopilot into a PolicyTable.
+
+Plays headless games with the full update_ai, recording the quantized
+situation (PolicyTable.situation) and the action taken in every autopilot
+frame, and keeps each situation's most common action. Recorded replays can
+be added as more training data. Held-out seeds then measure how often the
+table has an entry, how often its entry matches what update_ai does, and
+what flying by the table costs in score and buys in speed. --web marks the
+table for the web build, which ignores unmarked tables.
+
+Usage: python distill_policy.py [--games N] [--eval-games N] [--frames N]
+                                [--seed S] [--workers N] [--ai-profile FILE]
+                                [--replays FILE ...] [--out FILE] [--web]
+"""
+import argparse
+import concurrent.futures
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from game0 import FPS, POLICY_BOMB, POLICY_FILE, Game, PolicyTable, Replay, load_ai_profile  # noqa: E402
+from simulate import play  # noqa: E402
+
+ACTIONS = POLICY_BOMB + 1
+
+
+def record_ai(game):
+    # Wrap the game's update_ai so every call records (situation, action)
+    keys = []
+    actions = []
+    update_ai = game.update_ai
+
+    def recorded():
+        player = game.player
+        angle, thrust, loop_time, bombs = player.angle, player.thrust, player.last_loop_time, player.bombs
+        keys.append(PolicyTable.situation(game, *game.threat_offsets(game.gather_threats()[0])))
+        update_ai()
+        actions.append(PolicyTable.encode(player.angle - angle, player.thrust - thrust, player.thrust,
+                                          player.last_loop_time != loop_time, player.bombs < bombs))
+
+    game.update_ai = recorded
+    return keys, actions
+
+
+def record_seed(seed, max_frames, ai_params):
+    game = Game(headless=True, ai_params=ai_params)
+    keys, actions = record_ai(game)
+    game.run_headless(max_frames, ai_enabled=True, seed=seed)
+    return keys, actions
+
+
+def record_replay(path, ai_params):
+    game = Game(headless=True, ai_params=ai_params)
+    keys, actions = record_ai(game)
+    game.play_replay(Replay.load(path))
+    return keys, actions
+
+
+def time_ai(seed, max_frames, ai_params, policy=None):
+    # Mean autopilot time per call in microseconds, with or without the table
+    game = Game(headless=True, ai_params=ai_params, policy=PolicyTable.load(policy) if policy else None)
+    update_ai = game.update_ai
+    total = [0.0, 0]
+
+    def timed():
+        start = time.perf_counter()
+        update_ai()
+        total[0] += time.perf_counter() - start
+        total[1] += 1
+
+    game.update_ai = timed
+    game.run_headless(max_frames, ai_enabled=True, seed=seed)
+    return total[0] / total[1] * 1e6 if total[1] else 0.0
+
+
+def distill(recordings):
+    # Majority action per situation; ties go to the lowest action code
+    keys = np.concatenate([np.array(k, dtype=np.int64) for k, _ in recordings])
+    actions = np.concatenate([np.array(a, dtype=np.int64) for _, a in recordings])
+    pairs, counts = np.unique(keys * ACTIONS + actions, return_counts=True)
+    pair_keys, pair_actions = np.divmod(pairs, ACTIONS)
+    # Sort by key, then most counted first, and keep each key's first row
+    order = np.lexsort((-counts, pair_keys))
+    first = np.r_[True, pair_keys[order][1:] != pair_keys[order][:-1]]
+    rows = order[first]
+    return PolicyTable(pair_keys[rows].tolist(), pair_actions[rows].tolist()), len(keys)
+
+
+def agreement(table, recordings):
+    # Fraction of frames with a table entry, and of those, the fraction
+    # whose entry is the action update_ai took
+    frames = hits = agree = 0
+    for keys, actions in recordings:
+        for key, action in zip(keys, actions):
+            entry = table.table.get(key)
+            frames += 1
+            if entry is not None:
+                hits += 1
+                agree += entry == action
+    return hits / frames if frames else 0.0, agree / hits if hits else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=64, help='training games')
+    parser.add_argument('--eval-games', type=int, default=16, help='held-out games for the report')
+    parser.add_argument('--frames', type=int, default=FPS * 60 * 5, help='frame limit per game (default 5 game-minutes)')
+    parser.add_argument('--seed', type=int, default=0, help='training game i uses seed SEED + i, held-out games follow')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: one per CPU)')
+    parser.add_argument('--ai-profile', metavar='FILE', help='autopilot parameters written by tune_ai.py')
+    parser.add_argument('--replays', metavar='FILE', nargs='+', default=[], help='recorded games to learn from too')
+    parser.add_argument('--out', metavar='FILE', default=POLICY_FILE)
+    parser.add_argument('--web', action='store_true', help='let the web build (main.py) fly by the table')
+    args = parser.parse_args()
+
+    ai_params = load_ai_profile(args.ai_profile) if args.ai_profile else None
+    train_seeds = [args.seed + i for i in range(args.games)]
+    eval_seeds = [args.seed + args.games + i for i in range(args.eval_games)]
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+        recordings = list(pool.map(record_seed, train_seeds, [args.frames] * len(train_seeds),
+                                   [ai_params] * len(train_seeds)))
+        recordings += pool.map(record_replay, args.replays, [ai_params] * len(args.replays))
+        table, frames = distill(recordings)
+        table.web = args.web
+        table.save(args.out)
+        print(f"{len(table.table)} situations from {frames} autopilot frames -> {args.out} "
+              f"({os.path.getsize(args.out) / 1024:.0f} KB)")
+
+        held_out = list(pool.map(record_seed, eval_seeds, [args.frames] * len(eval_seeds),
+                                 [ai_params] * len(eval_seeds)))
+        coverage, agree = agreement(table, held_out)
+        print(f"held-out coverage {100 * coverage:.1f}%  agreement {100 * agree:.1f}% "
+              f"(training agreement {100 * agreement(table, recordings)[1]:.1f}%)")
+
+        frames = [args.frames] * len(eval_seeds)
+        params = [ai_params] * len(eval_seeds)
+        tables = [args.out] * len(eval_seeds)
+        full = list(pool.map(play, eval_seeds, frames, params))
+        distilled = list(pool.map(play, eval_seeds, frames, params, [False] * len(eval_seeds), tables))
+        full_us = list(pool.map(time_ai, eval_seeds, frames, params))
+        table_us = list(pool.map(time_ai, eval_seeds, frames, params, tables))
+    for name, results, ai_us in (('full AI', full, full_us), ('table', distilled, table_us)):
+        print(f"{name:>8}: score mean {statistics.mean(r['score'] for r in results):.1f}  "
+              f"median {statistics.median(r['score'] for r in results)}  "
+              f"stage mean {statistics.mean(r['stage'] for r in results):.2f}  "
+              f"autopilot {statistics.mean(ai_us):.1f} us/frame  "
+              f"{statistics.mean(r['fps'] for r in results):.0f} frames/s per game")
+
+
+if __name__ == "__main__":
+    main()
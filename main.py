@@ -2,9 +2,20 @@ import pygame
 import random
 import sys
 import math
+import cmath
+import hashlib
 import json
 import os
 import asyncio  # Added for Pygbag web support
+import bisect
+import collections
+import concurrent.futures
+import multiprocessing
+import struct
+import time
+import zlib
+
+import numpy as np
 
 # Initialize Pygame
 pygame.init()
@@ -33,6 +44,13 @@ STATE_PLAYING = "playing"
 STATE_PAUSED = "paused"
 STATE_GAME_OVER = "game_over"
 STATE_HELP = "help"
+STATES = (STATE_MENU, STATE_PLAYING, STATE_PAUSED, STATE_GAME_OVER, STATE_HELP)  # Snapshot encoding
+
+# What killed the player
+DEATH_ENEMY = "enemy"
+DEATH_BULLET = "bullet"
+DEATH_BOSS = "boss"
+DEATH_CAUSES = (DEATH_ENEMY, DEATH_BULLET, DEATH_BOSS)
 
 # Player constants
 ROTATION_SPEED = 4.5
@@ -45,15 +63,45 @@ LOOP_COOLDOWN = 3000  # Reduced from 5000 for more frequent use
 LOOP_RADIUS = 40
 BOMB_INVINCIBILITY_DURATION = 2000
 BOMB_FLASH_DURATION = 300
+ROTATION_CACHE_STEP = 2  # Degrees between pre-rotated player sprite frames
 
 # AI constants
 EMERGENCY_DODGE_RADIUS = 50  # Increased for larger world
 PERCEPTION_RADIUS = 150  # Increased for larger world
 
+# Autopilot tuning, overridable per game with Game(ai_params=...)
+AI_PARAMS = {
+    'enemy_threat': 6.0,  # Per enemy tier
+    'asteroid_threat': 3.0,
+    'bullet_threat': 25.0,
+    'boss_threat': 50.0,
+    'emergency_dodge_radius': EMERGENCY_DODGE_RADIUS,
+    'perception_radius': PERCEPTION_RADIUS,
+    'nearby_enemy_radius': 100,
+    'nearby_bullet_radius': 80,
+    'bomb_hp_ratio': 0.33,  # Bomb at or below this health when danger reaches bomb_danger
+    'bomb_danger': 4,
+    'bomb_bullets': 6,  # Bomb when this many bullets are nearby
+    'loop_danger': 5,
+    'loop_bullets': 4,
+    'loop_threat': 20.0,  # Emergency threats at least this dangerous are looped out of
+    'target_radius': 200,  # Weakest enemy within this range is targeted first
+    'optimal_dist': 110,
+    'boss_optimal_dist': 150,
+    'attraction': 0.3,
+    'low_hp_attraction': 0.15,
+    'predict_dodge_frames': 0,  # Sidestep enemies and bullets forecast to hit within this many frames; 0 is off
+    'predict_miss_radius': 12,  # Forecast miss distance that counts as a hit
+}
+
 # Enemy constants
 ENEMY_SPAWN_RATE = 50  # Slightly faster spawn for larger world
 ENEMY_BULLET_SPEED = 3.0
+HOMING_BULLET_SPEED = 2.5
+HOMING_BULLET_LIFETIME = 15000  # Tier 4+ bullets home in on the player for 15 seconds
 ENEMY_ROTATION_SPEED = 2.5
+ENEMY_HEADING_BUCKETS = 72  # Pre-rendered enemy headings (5 degrees apart)
+ENEMY_SPRITE_SIZE = 22  # Atlas cell size; the ship triangle fits in a 10 px radius
 
 # Boss constants
 BOSS_SPAWN_SCORE = 500
@@ -71,13 +119,443 @@ RESTART_DELAY = 3000
 TIME_SCORE_INTERVAL = 10000
 TIME_SCORE_AMOUNT = 1
 
+# Collision constants
+COLLISION_CELL_SIZE = 16  # Broadphase grid cell; >= largest hit radius (asteroid size 15)
+
+# Influence map constants
+INFLUENCE_CELL_SIZE = 16  # Danger overlay grid resolution
+
+# Prediction constants
+PREDICTION_FRAMES = 20  # How far ahead threats are extrapolated
+PREDICTION_STEERED_LIMIT = 64  # Homing bullets and enemies stepped per prediction, nearest first
+PREDICTION_BATCH_MIN = 10  # Steered threats from which stepping them as arrays beats a Python loop
+PREDICTION_NEAR = 60  # Steered threats that can't get this close within the horizon aren't stepped
+PREDICTION_BUDGET_US = 1000  # Time allowed per prediction, 3% of a frame at 30 FPS
+# Estimated prediction costs in microseconds, which decide how many steered
+# threats fit in the budget: the closed-form pass, per threat and fixed,
+# then stepping, per threat-frame one at a time or per frame and per
+# threat-frame as arrays
+PREDICTION_BASE_US = 60.0
+PREDICTION_THREAT_US = 0.15
+PREDICTION_EACH_US = 1.0
+PREDICTION_BATCH_FRAME_US = 11.0
+PREDICTION_BATCH_THREAT_US = 0.06
+
+# Planner constants
+PLANNER_HORIZON = 45  # Frames simulated per rollout, from the start of the candidate maneuver
+PLANNER_COMMIT = 10  # Autopilot frames a chosen maneuver is flown before replanning
+PLANNER_SAMPLES = 2  # Rollouts per maneuver, each with its own future randomness
+PLANNER_BUDGET_MS = 20  # Planning time per autopilot frame; an unfinished rollout carries on next frame
+PLANNER_DEATH_PENALTY = 1000  # Value lost by dying at the end of the horizon, twice that right away
+PLANNER_HEALTH_VALUE = 20  # Value of a hit point or shield point
+PLANNER_BOMB_VALUE = 15  # Value of a bomb kept for later
+MANEUVERS = ('auto', 'left', 'right', 'thrust', 'brake', 'loop', 'bomb')  # 'auto' is the reactive autopilot
+ONE_SHOT_MANEUVERS = ('loop', 'bomb')
+
+# Policy table constants
+POLICY_SECTORS = 8  # Heading-relative sectors around the player
+POLICY_BANDS = 3  # Range band of a sector's closest threat: 3 emergency, 2 nearby, 1 perceived, 0 none
+POLICY_BAND_WEIGHTS = (POLICY_BANDS + 1) ** np.arange(POLICY_SECTORS)  # Sector bands as key digits
+POLICY_BEARINGS = (-135, -45, -15, -ROTATION_SPEED / 2, ROTATION_SPEED / 2, 15, 45, 135)  # Target bearing bins
+POLICY_LOOP = 9  # Action codes; 0-8 are (turn + 1) * 3 + thrust, turn and thrust -1/0/+1 as 0/1/2
+POLICY_BOMB = 10
+POLICY_FILE = 'policy.npz'  # Table the web build (main.py) loads when it is bundled and marked web
+
+# Background constants
+STAR_COUNT = 150  # Stars per screen at star_density 1.0
+DUST_COUNT = 75  # Dust specks per screen at star_density 1.0
+
+# Dirty-rect renderer constants
+DIRTY_TILE_SIZE = 16  # Changed regions are tracked on this grid
+DIRTY_FULL_RATIO = 0.5  # Above this dirty fraction a full redraw is cheaper
+
+# HUD constants
+TEXT_CACHE_SIZE = 128  # Rendered strings kept by the LRU text cache
+HUD_HEIGHT = 85  # The HUD layer covers the top band of the screen
+
+# Profiler constants
+PROFILER_FRAMES = 120  # Frames in the rolling window and the frame-time graph
+PROFILER_REFRESH = 6  # Frames between redraws of the F3 overlay
+
+# Replay constants
+REPLAY_MAGIC = b'SGRP'
+REPLAY_VERSION = 4  # 2: autopilot target selection by TargetIndex, 3: autopilot setup block, 4: strategy interval
+# magic, version, fps, strategy interval, seed, start ticks, frame count, setup length
+REPLAY_HEADER = struct.Struct('<4sHHHIIII')
+REPLAY_FRAME = struct.Struct('<IBB')  # ms since previous frame, held-key mask, event count
+REPLAY_HELD_KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_UP, pygame.K_DOWN)  # Mask bits 0-3
+REPLAY_AI_BIT = 1 << 4  # Mask bit for the autopilot being on
+REPLAY_KEYS = (pygame.K_a, pygame.K_u, pygame.K_b, pygame.K_ESCAPE, pygame.K_h)  # Recorded KEYDOWNs, by index
+
+# Snapshot constants
+SNAPSHOT_MAGIC = b'SGSS'
+SNAPSHOT_VERSION = 3
+SNAPSHOT_HEADER = struct.Struct('<4sHBB???iiiIqqqqqqiiddqqIII')
+PLAYER_STATE = struct.Struct('<dddd7iqq?qddd')
+BOSS_STATE = struct.Struct('<ddiidiiiii')
+ENEMY_STATE = np.dtype([('tier', 'i1'), ('hp', 'i4'), ('speed', 'f8'), ('x', 'f8'), ('y', 'f8'), ('angle', 'f8')])
+ASTEROID_STATE = np.dtype([('size', 'i4'), ('x', 'f8'), ('y', 'f8'), ('vx', 'f8'), ('vy', 'f8')])
+AI_STATE = struct.Struct('<qbi??')  # ai_frames, target kind, target index, is enemy, target due
+AI_TARGET_NONE, AI_TARGET_BOSS, AI_TARGET_ENEMY, AI_TARGET_POWERUP = range(4)
+POWERUP_STATE = np.dtype([('type', 'i1'), ('x', 'f8'), ('y', 'f8'), ('vx', 'f8'), ('vy', 'f8')])
+
+# Rewind constants
+REWIND_SECONDS = 10  # Gameplay kept for rewinding
+REWIND_KEYFRAME_INTERVAL = 30  # Frames between full keyframes
+REWIND_BUDGET = 4 * 1024 * 1024  # Compressed history is kept under this many bytes
+
 # Particle constants
 PARTICLE_LIFETIME = 30
 SCREEN_SHAKE_DURATION = 200
 SCREEN_SHAKE_INTENSITY = 3
 
+# Asset directory (resolved from this file so headless runs work from any cwd)
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_ai_profile(path):
+    # Autopilot parameters saved by tune_ai.py
+    with open(path) as f:
+        return json.load(f)['params']
+
+
+def load_image(filename):
+    image = pygame.image.load(os.path.join(ASSET_DIR, filename))
+    # convert_alpha() needs a display mode; headless games keep the raw surface
+    if pygame.display.get_surface() is not None:
+        image = image.convert_alpha()
+    return image
+
+
+class RotatedSpriteCache:
+    """Pre-rotated copies of a sprite at a fixed angular resolution.
+
+    All frames are rendered up front, so drawing a rotated sprite is a list
+    lookup and a blit instead of a pygame.transform.rotate call. Angles use
+    pygame's convention (degrees, counter-clockwise).
+    """
+
+    def __init__(self, image, step=ROTATION_CACHE_STEP):
+        self.step = step
+        self.count = int(round(360 / step))
+        self.frames = []
+        self.offsets = []  # Half extents of each frame, for centering
+        for i in range(self.count):
+            rotated = pygame.transform.rotate(image, i * step)
+            self.frames.append(rotated)
+            self.offsets.append((rotated.get_width() / 2, rotated.get_height() / 2))
+        self.radius = max(max(offset) for offset in self.offsets)  # Covers every frame
+
+    def get(self, angle):
+        i = int(round(angle / self.step)) % self.count
+        return self.frames[i], self.offsets[i]
+
+    def blit(self, surface, angle, center):
+        frame, (half_w, half_h) = self.get(angle)
+        surface.blit(frame, (center[0] - half_w, center[1] - half_h))
+
+
+class WallClock:
+    """Real-time frame clock. Time is latched once per frame so every
+    entity sees the same timestamp for the whole frame."""
+
+    def __init__(self):
+        self.clock = pygame.time.Clock()
+        self.offset = 0  # Game time minus pygame time, moved by restore()
+        self.ticks = pygame.time.get_ticks()
+        self.frame = 0
+
+    def get_ticks(self):
+        return self.ticks
+
+    def tick(self, fps):
+        elapsed = self.clock.tick(fps)
+        self.ticks = pygame.time.get_ticks() + self.offset
+        self.frame += 1
+        return elapsed
+
+    def restore(self, ticks, frame):
+        # Game time carries on from ticks
+        self.offset = ticks - pygame.time.get_ticks()
+        self.ticks = ticks
+        self.frame = frame
+
+    def get_fps(self):
+        return self.clock.get_fps()
+
+
+class SimulatedClock:
+    """Frame clock for headless games: each tick advances exactly one frame
+    of game time and returns immediately, so update() runs as fast as the
+    CPU allows."""
+
+    def __init__(self, fps=FPS, start_ticks=0):
+        self.frame_ms = 1000.0 / fps
+        self.start_ticks = start_ticks
+        self.ticks = start_ticks
+        self.frame = 0
+
+    def get_ticks(self):
+        return self.ticks
+
+    def tick(self, fps=None):
+        self.frame += 1
+        self.ticks = self.start_ticks + int(self.frame * self.frame_ms)
+        return int(self.frame_ms)
+
+    def restore(self, ticks, frame):
+        self.start_ticks = ticks - int(frame * self.frame_ms)
+        self.ticks = ticks
+        self.frame = frame
+
+    def get_fps(self):
+        return 1000.0 / self.frame_ms
+
+
+class ReplayClock:
+    """Frame clock that reproduces the frame times of a recorded game.
+    Headless playback returns immediately from tick(); realtime playback
+    is paced like a live game."""
+
+    def __init__(self, replay, realtime=False):
+        self.dts = [frame[0] for frame in replay.frames]
+        self.fps = replay.fps
+        self.ticks = replay.start_ticks + (self.dts[0] if self.dts else 0)
+        self.frame = 0
+        self.clock = pygame.time.Clock() if realtime else None
+
+    def get_ticks(self):
+        return self.ticks
+
+    def tick(self, fps=None):
+        elapsed = self.clock.tick(fps or self.fps) if self.clock else 0
+        self.frame += 1
+        if self.frame < len(self.dts):
+            self.ticks += self.dts[self.frame]
+        return elapsed
+
+    def restore(self, ticks, frame):
+        self.ticks = ticks
+        self.frame = frame
+
+    def get_fps(self):
+        return self.clock.get_fps() if self.clock else float(self.fps)
+
+
+class RandomStreams:
+    """Independent seeded random streams, one per subsystem.
+
+    Each subsystem draws from its own stream, so a game is reproduced
+    exactly by its seed and cosmetic randomness (screen shake, debris)
+    never shifts spawns or drops.
+    """
+
+    NAMES = ('spawn', 'enemy', 'asteroid', 'powerup', 'fx')
+    STATE = struct.Struct('<625I')  # Mersenne Twister state
+    GAUSS = struct.Struct('<?d')  # Cached gauss() value, if any
+
+    def __init__(self, seed=0):
+        for name in self.NAMES:
+            setattr(self, name, random.Random())
+        self.seed(seed)
+
+    def seed(self, seed):
+        self.value = seed
+        for name in self.NAMES:
+            getattr(self, name).seed(f"{seed}:{name}")
+
+    def pack(self):
+        parts = [struct.pack('<I', self.value)]
+        for name in self.NAMES:
+            version, internal, gauss_next = getattr(self, name).getstate()
+            parts.append(self.STATE.pack(*internal))
+            parts.append(self.GAUSS.pack(gauss_next is not None, gauss_next or 0.0))
+        return b''.join(parts)
+
+    def unpack(self, data, offset):
+        # Returns the offset just past the streams
+        self.value, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        for name in self.NAMES:
+            internal = self.STATE.unpack_from(data, offset)
+            offset += self.STATE.size
+            has_gauss, gauss_next = self.GAUSS.unpack_from(data, offset)
+            offset += self.GAUSS.size
+            getattr(self, name).setstate((3, internal, gauss_next if has_gauss else None))
+        return offset
+
+
+class Replay:
+    """Recorded input of one game: its seed plus, for every frame, the time
+    step, the held movement keys and autopilot flag, and the KEYDOWNs.
+    `setup` is the autopilot configuration the game was played with
+    (Game.autopilot_setup()) and `strategy_interval` the autopilot's strategy
+    interval, both of which playback has to reproduce.
+
+    Files are a fixed header, the setup as JSON and the zlib-compressed
+    frame stream, a few bytes per game-minute.
+    """
+
+    def __init__(self, seed, start_ticks, fps=FPS, setup=None, strategy_interval=1):
+        self.seed = seed
+        self.start_ticks = start_ticks
+        self.fps = fps
+        self.setup = setup or {}
+        self.strategy_interval = strategy_interval
+        self.frames = []  # (dt_ms, mask, key codes)
+        self.ticks = start_ticks  # Time of the last recorded frame
+
+    def add_frame(self, ticks, mask, codes):
+        self.frames.append((ticks - self.ticks, mask, tuple(codes)))
+        self.ticks = ticks
+
+    def save(self, path):
+        body = bytearray()
+        for dt, mask, codes in self.frames:
+            body += REPLAY_FRAME.pack(dt, mask, len(codes))
+            body += bytes(codes)
+        setup = json.dumps(self.setup, sort_keys=True).encode()
+        header = REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, self.fps, self.strategy_interval, self.seed,
+                                    self.start_ticks, len(self.frames), len(setup))
+        with open(path, 'wb') as f:
+            f.write(header + setup + zlib.compress(bytes(body), 9))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, fps, strategy_interval, seed, start_ticks, count, setup_length = REPLAY_HEADER.unpack_from(data)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay")
+        offset = REPLAY_HEADER.size
+        setup = json.loads(data[offset:offset + setup_length])
+        body = zlib.decompress(data[offset + setup_length:])
+        replay = cls(seed, start_ticks, fps, setup, strategy_interval)
+        offset = 0
+        for _ in range(count):
+            dt, mask, n = REPLAY_FRAME.unpack_from(body, offset)
+            offset += REPLAY_FRAME.size
+            replay.frames.append((dt, mask, tuple(body[offset:offset + n])))
+            offset += n
+        replay.ticks = start_ticks + sum(frame[0] for frame in replay.frames)
+        return replay
+
+
+def xor_bytes(a, b):
+    # Byte-wise XOR, the shorter input zero-padded to the longer
+    out = np.zeros(max(len(a), len(b)), dtype=np.uint8)
+    out[:len(a)] = np.frombuffer(a, np.uint8)
+    out[:len(b)] ^= np.frombuffer(b, np.uint8)
+    return out.tobytes()
+
+
+class RewindBuffer:
+    """Fixed-memory history of recent game states for rewinding.
+
+    Every frame's snapshot is stored zlib-compressed, as a full keyframe
+    every keyframe_interval frames and as an XOR delta against the
+    previous frame otherwise (consecutive frames differ in few bytes, so
+    deltas compress to almost nothing). Whole keyframe groups are dropped
+    from the old end to stay within `seconds` of play and `budget` bytes.
+    Memory use and per-frame capture cost are tracked for display.
+    """
+
+    def __init__(self, seconds=REWIND_SECONDS, fps=FPS, keyframe_interval=REWIND_KEYFRAME_INTERVAL,
+                 budget=REWIND_BUDGET):
+        self.max_frames = int(seconds * fps)
+        self.keyframe_interval = keyframe_interval
+        self.budget = budget
+        self.frames = collections.deque()  # (is keyframe, snapshot length, compressed bytes)
+        self.bytes = 0
+        self.keyframes = 0
+        self.last = None  # Newest snapshot, the base for the next delta
+        self.since_keyframe = 0
+        self.decoded = []  # Snapshots of the newest keyframe group while scrubbing
+        self.capture_ms = 0.0
+        self.peak_capture_ms = 0.0
+
+    def __len__(self):
+        return len(self.frames)
+
+    def seconds(self, fps=FPS):
+        return len(self.frames) / fps
+
+    def report(self):
+        return (f"Rewind {self.seconds():.1f}s  {self.bytes / 1024:.0f} KB  "
+                f"capture {self.capture_ms:.2f} ms (peak {self.peak_capture_ms:.2f})")
+
+    def clear(self):
+        self.frames.clear()
+        self.bytes = 0
+        self.keyframes = 0
+        self.last = None
+        self.since_keyframe = 0
+        self.decoded = []
+
+    def capture(self, game):
+        start = time.perf_counter()
+        snapshot = game.snapshot()
+        keyframe = self.last is None or self.since_keyframe >= self.keyframe_interval
+        if keyframe:
+            data = zlib.compress(snapshot, 1)
+            self.keyframes += 1
+            self.since_keyframe = 0
+        else:
+            data = zlib.compress(xor_bytes(snapshot, self.last), 1)
+        self.frames.append((keyframe, len(snapshot), data))
+        self.bytes += len(data)
+        self.last = snapshot
+        self.since_keyframe += 1
+        self.decoded = []
+        self.trim()
+        self.capture_ms = (time.perf_counter() - start) * 1000
+        self.peak_capture_ms = max(self.peak_capture_ms, self.capture_ms)
+
+    def trim(self):
+        # Drop the oldest keyframe group while over either limit, always
+        # keeping the newest group
+        while self.keyframes > 1 and (len(self.frames) > self.max_frames or self.bytes > self.budget):
+            self.drop(self.frames.popleft())
+            while not self.frames[0][0]:
+                self.drop(self.frames.popleft())
+
+    def drop(self, frame):
+        keyframe, _, data = frame
+        self.bytes -= len(data)
+        self.keyframes -= keyframe
+
+    def decode_newest_group(self):
+        i = len(self.frames) - 1
+        while not self.frames[i][0]:
+            i -= 1
+        snapshot = b''
+        self.decoded = []
+        for j in range(i, len(self.frames)):
+            keyframe, length, data = self.frames[j]
+            raw = zlib.decompress(data)
+            snapshot = raw if keyframe else xor_bytes(raw, snapshot)[:length]
+            self.decoded.append(snapshot)
+
+    def step_back(self, game):
+        # Restores game to the frame before the newest one and drops the
+        # newest. Returns False when there is no older frame.
+        if len(self.frames) < 2:
+            return False
+        if not self.decoded:
+            self.decode_newest_group()
+        self.drop(self.frames.pop())
+        self.decoded.pop()
+        if not self.decoded:
+            self.decode_newest_group()
+        self.last = self.decoded[-1]
+        self.since_keyframe = len(self.decoded)
+        game.restore(self.last)
+        return True
+
 
 class Player:
+    sprites = None  # RotatedSpriteCache shared by every Player, built on first load
+
     def __init__(self, x, y):
         self.pos = [x, y]
         self.angle = -90.0
@@ -96,12 +574,13 @@ class Player:
         self.loop_start_pos = [0, 0]
         self.loop_start_angle = 0
 
-        # Load image
-        player_image_orig = pygame.image.load('craft0.png').convert_alpha()
-        self.image = pygame.transform.scale(player_image_orig, (30, 30))
+        # Load image (once) and pre-warm the rotation cache
+        if Player.sprites is None:
+            player_image_orig = load_image('craft0.png')
+            Player.sprites = RotatedSpriteCache(pygame.transform.scale(player_image_orig, (30, 30)))
 
-    def take_damage(self, amount=1):
-        if pygame.time.get_ticks() < self.invincible_until:
+    def take_damage(self, current_time, amount=1):
+        if current_time < self.invincible_until:
             return False
 
         if self.shield > 0:
@@ -109,7 +588,7 @@ class Player:
             return False
         else:
             self.hp -= amount
-            self.invincible_until = pygame.time.get_ticks() + 1500  # 1.5 seconds invincibility
+            self.invincible_until = current_time + 1500  # 1.5 seconds invincibility
             return self.hp <= 0
 
     def heal(self, amount=1):
@@ -195,76 +674,654 @@ class Player:
 
         return move_x, move_y
 
-    def shoot(self):
+    def shoot(self, bullets):
         rad = math.radians(self.angle)
         vel_x = math.cos(rad) * BULLET_SPEED
         vel_y = math.sin(rad) * BULLET_SPEED
-        bullets = []
 
         if self.weapon_level == 1:
-            bullets.append(Bullet(self.pos[0], self.pos[1], vel_x, vel_y))
+            bullets.add(self.pos[0], self.pos[1], vel_x, vel_y)
         elif self.weapon_level == 2:
             p_rad = math.radians(self.angle + 90)
             offset_x = math.cos(p_rad) * 5
             offset_y = math.sin(p_rad) * 5
-            bullets.append(Bullet(self.pos[0] + offset_x, self.pos[1] + offset_y, vel_x, vel_y))
-            bullets.append(Bullet(self.pos[0] - offset_x, self.pos[1] - offset_y, vel_x, vel_y))
+            bullets.add(self.pos[0] + offset_x, self.pos[1] + offset_y, vel_x, vel_y)
+            bullets.add(self.pos[0] - offset_x, self.pos[1] - offset_y, vel_x, vel_y)
         elif self.weapon_level == 3:
-            bullets.append(Bullet(self.pos[0], self.pos[1], vel_x, vel_y))
+            bullets.add(self.pos[0], self.pos[1], vel_x, vel_y)
             for angle_diff in [-20, 20]:
                 s_rad = math.radians(self.angle + angle_diff)
                 s_vel_x = math.cos(s_rad) * BULLET_SPEED
                 s_vel_y = math.sin(s_rad) * BULLET_SPEED
-                bullets.append(Bullet(self.pos[0], self.pos[1], s_vel_x, s_vel_y))
-
-        return bullets
-
-    def draw(self, surface):
-        rotated_image = pygame.transform.rotate(self.image, -self.angle - 90)
-        new_rect = rotated_image.get_rect(center=self.pos)
+                bullets.add(self.pos[0], self.pos[1], s_vel_x, s_vel_y)
 
+    def draw(self, surface, current_time):
         # Draw invincibility indicator
-        if pygame.time.get_ticks() < self.invincible_until:
-            if (pygame.time.get_ticks() // 100) % 2 == 0:
-                surface.blit(rotated_image, new_rect)
+        if current_time < self.invincible_until:
+            if (current_time // 100) % 2 == 0:
+                self.sprites.blit(surface, -self.angle - 90, self.pos)
+        else:
+            self.sprites.blit(surface, -self.angle - 90, self.pos)
+
+
+class StarfieldLayer:
+    """One parallax background layer, pre-rendered into a tileable surface.
+
+    Points are drawn once (wrapped across the edges, so the tile is
+    seamless) and the layer is composited with at most four blits at the
+    current scroll offset, whatever the star density.
+    """
+
+    def __init__(self, count, colors, size, parallax, width=WIDTH, height=HEIGHT):
+        self.parallax = parallax
+        self.width = width
+        self.height = height
+        self.surface = pygame.Surface((width, height))
+        if pygame.display.get_surface() is not None:
+            self.surface = self.surface.convert()
+        self.surface.fill(BLACK)
+        self.surface.set_colorkey(BLACK)
+        for _ in range(count):
+            x = random.randint(0, width) % width
+            y = random.randint(0, height) % height
+            color = random.choice(colors)
+            for wrap_x in (x, x - width):
+                for wrap_y in (y, y - height):
+                    pygame.draw.rect(self.surface, color, (wrap_x, wrap_y, size, size))
+
+    def draw(self, target, scroll, shake):
+        x = int(scroll[0] * self.parallax + shake[0]) % self.width
+        y = int(scroll[1] * self.parallax + shake[1]) % self.height
+        target.blit(self.surface, (x, y))
+        if x:
+            target.blit(self.surface, (x - self.width, y))
+        if y:
+            target.blit(self.surface, (x, y - self.height))
+            if x:
+                target.blit(self.surface, (x - self.width, y - self.height))
+
+
+class TextCache:
+    """LRU cache of rendered text surfaces keyed by (font, text, color)."""
+
+    def __init__(self, max_entries=TEXT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.entries.get(key)
+        if surface is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self.entries[key] = surface
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return surface
+
+
+class RenderTargets:
+    """Persistent low-res and scaled frame buffers in the output's pixel format.
+
+    The buffers are rebuilt only when WIDTH/HEIGHT/SCALE or the output
+    surface (display mode) changes. `timings` holds the last frame's
+    clear, compose, scale and flip durations in milliseconds.
+    """
+
+    STAGES = ('clear', 'compose', 'scale', 'flip')
+
+    def __init__(self, output=None):
+        self.output = output  # Fixed output surface; None follows the display
+        self.key = None
+        self.target = None
+        self.low_res = None
+        self.scaled = None
+        self.scaled_pos = (0, 0)
+        self.rebuilds = 0
+        self.rects = None
+        self.timings = dict.fromkeys(self.STAGES, 0.0)
+        self.mark_time = 0.0
+
+    def rebuild(self, target):
+        size = (WIDTH * SCALE, HEIGHT * SCALE)
+        # Surfaces created with the target as template share its pixel format,
+        # so neither the scale nor the final blit has to convert
+        self.low_res = pygame.Surface((WIDTH, HEIGHT), 0, target)
+        if target.get_size() == size:
+            self.scaled = target  # Scale straight into the output
+            self.scaled_pos = (0, 0)
+        else:
+            self.scaled = pygame.Surface(size, 0, target)
+            self.scaled_pos = ((target.get_width() - size[0]) // 2,
+                               (target.get_height() - size[1]) // 2)
+            target.fill(BLACK)  # Letterbox border, never overdrawn
+        self.target = target
+        self.rebuilds += 1
+
+    def begin(self, color, rects=None):
+        # Returns the low-res buffer to compose the frame into, cleared
+        # everywhere or only inside rects. A rebuild always clears everything;
+        # self.rects says which happened.
+        target = self.output if self.output is not None else pygame.display.get_surface()
+        key = (WIDTH, HEIGHT, SCALE, id(target), target.get_size(),
+               target.get_bitsize(), target.get_masks())
+        if key != self.key:
+            self.rebuild(target)
+            self.key = key
+            rects = None
+        self.rects = rects
+        self.mark_time = time.perf_counter()
+        if rects is None:
+            self.low_res.fill(color)
+        else:
+            for r in rects:
+                self.low_res.fill(color, r)
+        self.mark('clear')
+        return self.low_res
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.timings[stage] = (now - self.mark_time) * 1000
+        self.mark_time = now
+
+    def present(self, flip=True):
+        # Partial frames scale and push only the regions given to begin()
+        self.mark('compose')
+        rects = self.rects
+        if rects is None:
+            pygame.transform.scale(self.low_res, self.scaled.get_size(), self.scaled)
+            if self.scaled is not self.target:
+                self.target.blit(self.scaled, self.scaled_pos)
         else:
-            surface.blit(rotated_image, new_rect)
+            updated = []
+            for r in rects:
+                area = pygame.Rect(r.x * SCALE, r.y * SCALE, r.w * SCALE, r.h * SCALE)
+                pygame.transform.scale(self.low_res.subsurface(r), area.size, self.scaled.subsurface(area))
+                if self.scaled is not self.target:
+                    self.target.blit(self.scaled, area.move(self.scaled_pos), area)
+                updated.append(area.move(self.scaled_pos))
+        self.mark('scale')
+        if flip:
+            if rects is None:
+                pygame.display.flip()
+            else:
+                pygame.display.update(updated)
+        self.mark('flip')
 
+    def frame_ms(self):
+        return sum(self.timings.values())
 
-class Bullet:
-    def __init__(self, x, y, vel_x, vel_y):
-        self.pos = [x, y]
-        self.vel = [vel_x, vel_y]
 
-    def update(self):
-        self.pos[0] += self.vel[0]
-        self.pos[1] += self.vel[1]
-        return 0 < self.pos[0] < WIDTH and 0 < self.pos[1] < HEIGHT
+class DirtyTiles:
+    """Tile mask of the screen regions touched by moving entities.
 
-    def draw(self, surface):
-        pygame.draw.rect(surface, WHITE, (self.pos[0], self.pos[1], 3, 3))
+    The mark methods flag the tiles under this frame's bounding boxes.
+    rects() covers both this frame's tiles and the previous frame's, so
+    everything is redrawn where it is now and erased where it was.
+    """
+
+    def __init__(self, tile_size=DIRTY_TILE_SIZE, width=WIDTH, height=HEIGHT):
+        self.tile_size = tile_size
+        self.width = width
+        self.height = height
+        self.cols = -(-width // tile_size)
+        self.rows = -(-height // tile_size)
+        self.current = np.zeros((self.rows, self.cols), dtype=bool)
+        self.previous = np.zeros((self.rows, self.cols), dtype=bool)
+
+    def mark_box(self, x0, y0, x1, y1):
+        # Pixels x0 <= x < x1, y0 <= y < y1
+        if x1 <= 0 or y1 <= 0 or x0 >= self.width or y0 >= self.height:
+            return
+        t = self.tile_size
+        tx0, ty0 = max(0, int(x0) // t), max(0, int(y0) // t)
+        tx1 = min(self.cols - 1, (int(x1) - 1) // t)
+        ty1 = min(self.rows - 1, (int(y1) - 1) // t)
+        self.current[ty0:ty1 + 1, tx0:tx1 + 1] = True
+
+    def mark_squares(self, xs, ys, extent):
+        # size x size squares with top-left (xs, ys), as drawn by draw_squares
+        if len(xs) == 0:
+            return
+        xi = xs.astype(np.intp)
+        yi = ys.astype(np.intp)
+        inside = (xi + extent > 0) & (xi < self.width) & (yi + extent > 0) & (yi < self.height)
+        xi, yi = xi[inside], yi[inside]
+        # Marking the corners (and every tile in between for large squares)
+        # flags each tile a square overlaps
+        steps = sorted(set(range(0, extent, self.tile_size)) | {extent - 1})
+        t = self.tile_size
+        for dy in steps:
+            ty = np.clip((yi + dy) // t, 0, self.rows - 1)
+            for dx in steps:
+                tx = np.clip((xi + dx) // t, 0, self.cols - 1)
+                self.current[ty, tx] = True
+
+    def mark_all(self):
+        self.current[:] = True
+
+    def fraction(self):
+        return np.count_nonzero(self.current | self.previous) / self.current.size
+
+    def rects(self):
+        # Merge each tile row into horizontal runs, one Rect per run
+        mask = self.current | self.previous
+        edges = np.diff(np.pad(mask, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+        rows, cols = np.nonzero(edges)
+        t = self.tile_size
+        rects = []
+        for row, start, end in zip(rows[0::2].tolist(), cols[0::2].tolist(), cols[1::2].tolist()):
+            x, y = start * t, row * t
+            rects.append(pygame.Rect(x, y, min(end * t, self.width) - x, min(t, self.height - y)))
+        return rects
+
+    def end_frame(self):
+        self.previous, self.current = self.current, self.previous
+        self.current[:] = False
+
+
+class AllocationCounter:
+    """Counts entity allocations (pool misses and store growth) per frame.
+    A steady-state game loop should report close to zero."""
+
+    def __init__(self):
+        self.current = 0
+        self.last_frame = 0
+        self.peak = 0
+        self.total = 0
+        self.frames = 0
+
+    def add(self, n=1):
+        self.current += n
+
+    def end_frame(self):
+        self.last_frame = self.current
+        self.peak = max(self.peak, self.current)
+        self.total += self.current
+        self.frames += 1
+        self.current = 0
+
+    def per_frame(self):
+        return self.total / self.frames if self.frames else 0.0
+
+
+class FrameProfiler:
+    """Rolling per-phase timings of the windowed main loop, shown with F3.
+
+    While the overlay is on, Game.run() marks the end of each loop phase
+    and update_ai and handle_collisions are timed by wrappers set on the
+    game instance; attach() and detach() add and remove them, so with the
+    overlay off nothing is timed at all. `entities` is the rest of
+    update(), and `compose` is draw() minus the scale and flip that
+    RenderTargets times (it includes drawing the overlay itself).
+    """
+
+    PHASES = ('events', 'ai', 'entities', 'collisions', 'compose', 'scale', 'flip', 'idle')
+    TIMED = (('update_ai', 'ai'), ('handle_collisions', 'collisions'))
+
+    def __init__(self, frames=PROFILER_FRAMES, refresh=PROFILER_REFRESH):
+        self.history = np.zeros((frames, len(self.PHASES)))  # Milliseconds, a ring of recent frames
+        self.frames = 0
+        self.refresh = refresh
+        self.current = dict.fromkeys(self.PHASES, 0.0)  # Seconds, this frame so far
+        self.mark_time = 0.0
+        self.font = None
+        self.panel = None
+
+    def attach(self, game):
+        for name, phase in self.TIMED:
+            setattr(game, name, self.timed(getattr(game, name), phase))
+
+    def detach(self, game):
+        # The instance wrappers shadowed the methods; dropping them restores them
+        for name, _ in self.TIMED:
+            game.__dict__.pop(name, None)
+
+    def timed(self, method, phase):
+        current = self.current
+
+        def wrapper(*args):
+            start = time.perf_counter()
+            result = method(*args)
+            current[phase] += time.perf_counter() - start
+            return result
+
+        return wrapper
+
+    def begin(self):
+        for phase in self.PHASES:
+            self.current[phase] = 0.0
+        self.mark_time = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.current[phase] += now - self.mark_time
+        self.mark_time = now
+
+    def end_frame(self, render_timings):
+        c = self.current
+        c['entities'] -= c['ai'] + c['collisions']
+        c['scale'] = render_timings['scale'] / 1000
+        c['flip'] = render_timings['flip'] / 1000
+        c['compose'] -= c['scale'] + c['flip']
+        self.history[self.frames % len(self.history)] = [c[phase] * 1000 for phase in self.PHASES]
+        self.frames += 1
+
+    def recent(self):
+        # Rows of the frames in the window, oldest first
+        n = len(self.history)
+        if self.frames < n:
+            return self.history[:self.frames]
+        return np.roll(self.history, -(self.frames % n), axis=0)
+
+    def draw(self, surface, game):
+        if self.panel is None or self.frames % self.refresh == 0:
+            self.panel = self.compose(game)
+        surface.blit(self.panel, (0, HEIGHT - self.panel.get_height()))
+
+    def compose(self, game):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 16)
+        font = self.font
+        line = font.get_linesize()
+        recent = self.recent()
+        graph_height = 30
+        panel = pygame.Surface((170, line * 13 + graph_height + 8), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        if len(recent):
+            mean = recent.mean(axis=0)
+            peak = recent.max(axis=0)
+            busy = recent[:, :-1].sum(axis=1)
+            total = recent.sum(axis=1)
+        else:
+            mean = peak = np.zeros(len(self.PHASES))
+            busy = total = np.zeros(0)
+
+        def text(x, y, value, color=WHITE, right=False):
+            rendered = font.render(value, True, color)
+            panel.blit(rendered, (x - rendered.get_width() if right else x, y))
+
+        y = 4
+        text(4, y, "ms", GRAY)
+        text(114, y, "mean", GRAY, right=True)
+        text(164, y, "max", GRAY, right=True)
+        for phase, m, p in zip(self.PHASES, mean.tolist(), peak.tolist()):
+            y += line
+            text(4, y, phase, CYAN)
+            text(114, y, f"{m:.2f}", right=True)
+            text(164, y, f"{p:.2f}", right=True)
+        y += line
+        text(4, y, "busy", YELLOW)
+        text(114, y, f"{busy.mean() if len(busy) else 0:.2f}", YELLOW, right=True)
+        text(164, y, f"{busy.max() if len(busy) else 0:.2f}", YELLOW, right=True)
+        y += line
+        text(4, y, f"bullets {game.bullets.count}  enemy {game.enemy_bullets.count}")
+        y += line
+        text(4, y, f"enemies {len(game.enemies)}  ast {len(game.asteroids)}  pwr {len(game.powerups)}")
+        y += line
+        text(4, y, f"expl {game.explosions.count}  engine {game.engine_particles.count}  "
+                   f"alloc {game.allocations.last_frame}")
+
+        # Frame-time graph, one column per frame: gray up to the whole
+        # frame, busy time over it, and a line at the frame budget
+        bottom = panel.get_height() - 4
+        budget = 1000 / FPS
+        scale = graph_height / (2 * budget)
+        for x, (frame_ms, busy_ms) in enumerate(zip(total.tolist(), busy.tolist()), 25):
+            pygame.draw.line(panel, GRAY, (x, bottom), (x, bottom - min(graph_height, frame_ms * scale)))
+            pygame.draw.line(panel, GREEN if busy_ms < budget else RED, (x, bottom),
+                             (x, bottom - min(graph_height, busy_ms * scale)))
+        pygame.draw.line(panel, YELLOW, (25, bottom - budget * scale), (25 + len(self.history), bottom - budget * scale))
+        return panel
+
+
+class ObjectPool:
+    """Free list of reusable entity records. Pooled classes use __slots__
+    and a reset() that takes the same arguments as their constructor."""
+
+    def __init__(self, factory, allocations=None):
+        self.factory = factory
+        self.free = []
+        self.allocations = allocations
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args, **kwargs)
+            return obj
+        if self.allocations is not None:
+            self.allocations.add()
+        return self.factory(*args, **kwargs)
+
+    def acquire_blank(self):
+        # A record whose fields the caller sets (snapshot restore), taken
+        # without running reset() and its RNG draws
+        if self.free:
+            return self.free.pop()
+        if self.allocations is not None:
+            self.allocations.add()
+        return self.factory.blank()
+
+    def release(self, obj):
+        self.free.append(obj)
+
+    def release_all(self, objs):
+        self.free.extend(objs)
+
+
+def draw_squares(surface, xs, ys, size, colors):
+    # Rasterize size x size squares at (xs, ys) with one vectorized pixel write.
+    # colors is a single mapped color or one mapped color per square.
+    if len(xs) == 0:
+        return
+    xi = xs.astype(np.intp)
+    yi = ys.astype(np.intp)
+    if size > 1:
+        offsets = np.arange(size)
+        ox = np.tile(offsets, size)
+        oy = np.repeat(offsets, size)
+        xi = (xi[:, None] + ox).ravel()
+        yi = (yi[:, None] + oy).ravel()
+        if not np.isscalar(colors):
+            colors = np.repeat(colors, size * size)
+    width, height = surface.get_size()
+    inside = (xi >= 0) & (xi < width) & (yi >= 0) & (yi < height)
+    if not np.isscalar(colors):
+        colors = colors[inside]
+    pixels = pygame.surfarray.pixels2d(surface)
+    pixels[xi[inside], yi[inside]] = colors
+    del pixels  # Unlocks the surface
+
+
+class BulletStore:
+    """Structure-of-arrays bullet storage.
+
+    Rows [0, count) hold live bullets in spawn order. tier is 0 for player
+    bullets; tier 4+ enemy bullets home in on the target. birth is the
+    creation time in ms (the game clock), used for homing expiry.
+    """
+
+    COLUMNS = ('x', 'y', 'vx', 'vy', 'tier', 'birth')
+
+    def __init__(self, capacity=256, allocations=None):
+        self.count = 0
+        self.allocations = allocations
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.tier = np.zeros(capacity, dtype=np.int8)
+        self.birth = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.ones(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self):
+        if self.allocations is not None:
+            self.allocations.add()
+        capacity = len(self.x) * 2
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.alive = np.ones(capacity, dtype=bool)
+
+    def add(self, x, y, vel_x, vel_y, tier=0, birth=0):
+        if self.count == len(self.x):
+            self._grow()
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.vx[i] = vel_x
+        self.vy[i] = vel_y
+        self.tier[i] = tier
+        self.birth[i] = birth
+        self.alive[i] = True
+        self.count += 1
+
+    def clear(self):
+        self.count = 0
+
+    def kill(self, i):
+        self.alive[i] = False
+
+    def compact(self):
+        # Drop killed rows, keeping spawn order
+        n = self.count
+        keep = self.alive[:n]
+        if keep.all():
+            return
+        k = int(np.count_nonzero(keep))
+        for arr in (self.x, self.y, self.vx, self.vy, self.tier, self.birth):
+            arr[:k] = arr[:n][keep]
+        self.alive[:n] = True
+        self.count = k
+
+    def update(self, current_time=0, target_pos=None):
+        # One vectorized pass: integrate, home tier 4+ bullets, expire and cull
+        n = self.count
+        if n == 0:
+            return
+        x, y = self.x[:n], self.y[:n]
+        homing = self.tier[:n] >= 4
+        if homing.any():
+            expired = homing & (current_time - self.birth[:n] > HOMING_BULLET_LIFETIME)
+            step_x, step_y = self.vx[:n], self.vy[:n]
+            if target_pos is not None:
+                dx = target_pos[0] - x
+                dy = target_pos[1] - y
+                dist = np.hypot(dx, dy)
+                moving = dist > 0
+                safe_dist = np.where(moving, dist, 1.0)
+                step_x = np.where(homing, np.where(moving, dx / safe_dist * HOMING_BULLET_SPEED, 0.0), step_x)
+                step_y = np.where(homing, np.where(moving, dy / safe_dist * HOMING_BULLET_SPEED, 0.0), step_y)
+            x += step_x
+            y += step_y
+            self.alive[:n] = ~expired & (x > 0) & (x < WIDTH) & (y > 0) & (y < HEIGHT)
+        else:
+            x += self.vx[:n]
+            y += self.vy[:n]
+            self.alive[:n] = (x > 0) & (x < WIDTH) & (y > 0) & (y < HEIGHT)
+        self.compact()
+
+    def hits(self, pos, radius):
+        # Indices of bullets within radius of pos, in spawn order
+        n = self.count
+        return np.flatnonzero(np.hypot(pos[0] - self.x[:n], pos[1] - self.y[:n]) < radius)
+
+    def positions(self):
+        n = self.count
+        return zip(self.x[:n].tolist(), self.y[:n].tolist())
+
+    def draw(self, surface, size, color):
+        n = self.count
+        draw_squares(surface, self.x[:n], self.y[:n], size, surface.map_rgb(color))
+
+    def pack(self):
+        n = self.count
+        return struct.pack('<I', n) + b''.join(getattr(self, name)[:n].tobytes() for name in self.COLUMNS)
+
+    def unpack(self, data, offset):
+        # Returns the offset just past this store
+        n, = struct.unpack_from('<I', data, offset)
+        offset += 4
+        while len(self.x) < n:
+            self._grow()
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[:n] = np.frombuffer(data, column.dtype, n, offset)
+            offset += n * column.itemsize
+        self.alive[:n] = True
+        self.count = n
+        return offset
 
 
 class Enemy:
+    __slots__ = ('tier', 'hp', 'speed', 'pos', 'angle', 'rng')
     TIER_COLORS = [RED, YELLOW, BLUE, GREEN, WHITE, GRAY]
     TIER_SPAWN_PROBS = [0.4, 0.3, 0.15, 0.08, 0.05, 0.02]
     LOW_TIER_PROBS = [0.47, 0.35, 0.18]
-
-    def __init__(self, tier, low_tier_only=True):
+    SHIP_POINTS = [(10, 0), (-5, -7), (-5, 7)]
+    sheet = None
+    atlas = None  # atlas[tier - 1][heading bucket] -> subsurface of sheet, built on first draw and shared
+
+    @classmethod
+    def build_atlas(cls):
+        # One surface holding every tier color at every heading bucket
+        cell = ENEMY_SPRITE_SIZE
+        center = cell / 2
+        sheet = pygame.Surface((cell * ENEMY_HEADING_BUCKETS, cell * len(cls.TIER_COLORS)), pygame.SRCALPHA)
+        if pygame.display.get_surface() is not None:
+            sheet = sheet.convert_alpha()
+        sheet.fill((0, 0, 0, 0))
+        atlas = []
+        for row, color in enumerate(cls.TIER_COLORS):
+            frames = []
+            for bucket in range(ENEMY_HEADING_BUCKETS):
+                rad = math.radians(bucket * 360 / ENEMY_HEADING_BUCKETS)
+                origin_x = bucket * cell + center
+                origin_y = row * cell + center
+                points = [(origin_x + x * math.cos(rad) - y * math.sin(rad),
+                           origin_y + x * math.sin(rad) + y * math.cos(rad)) for x, y in cls.SHIP_POINTS]
+                pygame.draw.polygon(sheet, color, points)
+                frames.append(sheet.subsurface((bucket * cell, row * cell, cell, cell)))
+            atlas.append(frames)
+        cls.sheet = sheet
+        cls.atlas = atlas
+
+    def __init__(self, tier, low_tier_only=True, rng=random):
+        self.pos = [0, 0]
+        self.reset(tier, low_tier_only, rng)
+
+    @classmethod
+    def blank(cls):
+        enemy = cls.__new__(cls)
+        enemy.pos = [0, 0]
+        return enemy
+
+    def reset(self, tier, low_tier_only=True, rng=random):
         self.tier = tier
         self.hp = tier * 2
         self.speed = 1 + tier * 0.5
+        self.rng = rng
 
         # Spawn position
-        side = random.choice(['top', 'bottom', 'left', 'right'])
+        side = rng.choice(['top', 'bottom', 'left', 'right'])
         if side == 'top':
-            self.pos = [random.randint(0, WIDTH), -20]
+            self.pos[:] = rng.randint(0, WIDTH), -20
         elif side == 'bottom':
-            self.pos = [random.randint(0, WIDTH), HEIGHT + 20]
+            self.pos[:] = rng.randint(0, WIDTH), HEIGHT + 20
         elif side == 'left':
-            self.pos = [-20, random.randint(0, HEIGHT)]
+            self.pos[:] = -20, rng.randint(0, HEIGHT)
         else:
-            self.pos = [WIDTH + 20, random.randint(0, HEIGHT)]
+            self.pos[:] = WIDTH + 20, rng.randint(0, HEIGHT)
 
         self.angle = math.degrees(math.atan2(HEIGHT/2 - self.pos[1], WIDTH/2 - self.pos[0]))
 
@@ -285,61 +1342,24 @@ class Enemy:
         return math.hypot(target_dx, target_dy)
 
     def should_shoot(self):
-        return random.randint(0, 70 // self.tier) == 0
+        return self.rng.randint(0, 70 // self.tier) == 0
 
-    def shoot(self):
+    def shoot(self, bullets, current_time):
         rad = math.radians(self.angle)
         vel_x = math.cos(rad) * ENEMY_BULLET_SPEED
         vel_y = math.sin(rad) * ENEMY_BULLET_SPEED
-        return EnemyBullet(self.pos[0], self.pos[1], vel_x, vel_y, self.tier)
+        bullets.add(self.pos[0], self.pos[1], vel_x, vel_y, self.tier, current_time)
 
     def take_damage(self, amount=1):
         self.hp -= amount
         return self.hp <= 0
 
     def draw(self, surface):
-        color = self.TIER_COLORS[self.tier - 1]
-        ship_points = [(10, 0), (-5, -7), (-5, 7)]
-        rad = math.radians(self.angle)
-        rotated_points = []
-        for x, y in ship_points:
-            new_x = x * math.cos(rad) - y * math.sin(rad)
-            new_y = x * math.sin(rad) + y * math.cos(rad)
-            rotated_points.append((self.pos[0] + new_x, self.pos[1] + new_y))
-        pygame.draw.polygon(surface, color, rotated_points)
-
-
-class EnemyBullet:
-    def __init__(self, x, y, vel_x, vel_y, tier):
-        self.pos = [x, y]
-        self.vel = [vel_x, vel_y]
-        self.tier = tier
-        self.creation_time = pygame.time.get_ticks()
-
-    def update(self, target_pos=None):
-        # Check if homing bullet has expired (15 seconds lifetime)
-        if self.tier >= 4:
-            current_time = pygame.time.get_ticks()
-            if current_time - self.creation_time > 15000:  # 15 seconds
-                return False
-
-        if self.tier >= 4 and target_pos:
-            # Homing bullet
-            dx = target_pos[0] - self.pos[0]
-            dy = target_pos[1] - self.pos[1]
-            dist = math.hypot(dx, dy)
-            if dist > 0:
-                homing_speed = 2.5
-                self.pos[0] += (dx / dist) * homing_speed
-                self.pos[1] += (dy / dist) * homing_speed
-        else:
-            self.pos[0] += self.vel[0]
-            self.pos[1] += self.vel[1]
-
-        return 0 < self.pos[0] < WIDTH and 0 < self.pos[1] < HEIGHT
-
-    def draw(self, surface):
-        pygame.draw.rect(surface, RED, (self.pos[0], self.pos[1], 2, 2))
+        if Enemy.atlas is None:
+            Enemy.build_atlas()
+        bucket = int(round(self.angle * ENEMY_HEADING_BUCKETS / 360)) % ENEMY_HEADING_BUCKETS
+        half = ENEMY_SPRITE_SIZE / 2
+        surface.blit(self.atlas[self.tier - 1][bucket], (self.pos[0] - half, self.pos[1] - half))
 
 
 class Boss:
@@ -380,8 +1400,7 @@ class Boss:
             return True
         return False
 
-    def shoot(self, target_pos):
-        bullets = []
+    def shoot(self, target_pos, bullets, current_time):
 
         if self.phase == 1:
             # Pattern 1: Aimed shot
@@ -391,7 +1410,7 @@ class Boss:
             if dist > 0:
                 vel_x = (dx / dist) * ENEMY_BULLET_SPEED
                 vel_y = (dy / dist) * ENEMY_BULLET_SPEED
-                bullets.append(EnemyBullet(self.pos[0], self.pos[1], vel_x, vel_y, 5))
+                bullets.add(self.pos[0], self.pos[1], vel_x, vel_y, 5, current_time)
 
         elif self.phase == 2:
             # Pattern 2: Triple shot
@@ -402,7 +1421,7 @@ class Boss:
                 angle = base_angle + math.radians(angle_offset)
                 vel_x = math.cos(angle) * ENEMY_BULLET_SPEED
                 vel_y = math.sin(angle) * ENEMY_BULLET_SPEED
-                bullets.append(EnemyBullet(self.pos[0], self.pos[1], vel_x, vel_y, 5))
+                bullets.add(self.pos[0], self.pos[1], vel_x, vel_y, 5, current_time)
 
         else:  # Phase 3
             # Pattern 3: Circular pattern
@@ -411,9 +1430,7 @@ class Boss:
                 angle = (2 * math.pi / num_bullets) * i + (self.attack_timer * 0.1)
                 vel_x = math.cos(angle) * ENEMY_BULLET_SPEED
                 vel_y = math.sin(angle) * ENEMY_BULLET_SPEED
-                bullets.append(EnemyBullet(self.pos[0], self.pos[1], vel_x, vel_y, 6))
-
-        return bullets
+                bullets.add(self.pos[0], self.pos[1], vel_x, vel_y, 6, current_time)
 
     def take_damage(self, amount=1):
         self.hp -= amount
@@ -470,29 +1487,43 @@ class Boss:
 
 
 class Asteroid:
-    def __init__(self):
-        self.size = random.randint(5, 15)
-        speed = random.uniform(0.5, 2.0)
+    __slots__ = ('size', 'pos', 'vel')
+
+    def __init__(self, rng=random):
+        self.pos = [0, 0]
+        self.vel = [0, 0]
+        self.reset(rng)
+
+    @classmethod
+    def blank(cls):
+        asteroid = cls.__new__(cls)
+        asteroid.pos = [0, 0]
+        asteroid.vel = [0, 0]
+        return asteroid
+
+    def reset(self, rng=random):
+        self.size = rng.randint(5, 15)
+        speed = rng.uniform(0.5, 2.0)
 
         # Spawn position
-        side = random.choice(['top', 'bottom', 'left', 'right'])
+        side = rng.choice(['top', 'bottom', 'left', 'right'])
         if side == 'top':
-            self.pos = [random.randint(0, WIDTH), -ASTEROID_SPAWN_MARGIN]
+            self.pos[:] = rng.randint(0, WIDTH), -ASTEROID_SPAWN_MARGIN
         elif side == 'bottom':
-            self.pos = [random.randint(0, WIDTH), HEIGHT + ASTEROID_SPAWN_MARGIN]
+            self.pos[:] = rng.randint(0, WIDTH), HEIGHT + ASTEROID_SPAWN_MARGIN
         elif side == 'left':
-            self.pos = [-ASTEROID_SPAWN_MARGIN, random.randint(0, HEIGHT)]
+            self.pos[:] = -ASTEROID_SPAWN_MARGIN, rng.randint(0, HEIGHT)
         else:
-            self.pos = [WIDTH + ASTEROID_SPAWN_MARGIN, random.randint(0, HEIGHT)]
+            self.pos[:] = WIDTH + ASTEROID_SPAWN_MARGIN, rng.randint(0, HEIGHT)
 
-        target_pos = [random.randint(0, WIDTH), random.randint(0, HEIGHT)]
+        target_pos = [rng.randint(0, WIDTH), rng.randint(0, HEIGHT)]
         dx = target_pos[0] - self.pos[0]
         dy = target_pos[1] - self.pos[1]
         dist = math.hypot(dx, dy)
         if dist > 0:
-            self.vel = [(dx / dist) * speed, (dy / dist) * speed]
+            self.vel[:] = (dx / dist) * speed, (dy / dist) * speed
         else:
-            self.vel = [0, 0]
+            self.vel[:] = 0, 0
 
     def update(self):
         self.pos[0] += self.vel[0]
@@ -505,17 +1536,31 @@ class Asteroid:
 
 
 class PowerUp:
+    __slots__ = ('pos', 'vel', 'type')
     TYPE_WEAPON = "weapon"
     TYPE_HEALTH = "health"
     TYPE_SHIELD = "shield"
     TYPE_BOMB = "bomb"
-
-    def __init__(self, x, y, power_type=None):
-        self.pos = [x, y]
+    TYPES = (TYPE_WEAPON, TYPE_HEALTH, TYPE_SHIELD, TYPE_BOMB)
+
+    def __init__(self, x, y, power_type=None, rng=random):
+        self.pos = [0, 0]
+        self.vel = [0, 0]
+        self.reset(x, y, power_type, rng)
+
+    @classmethod
+    def blank(cls):
+        powerup = cls.__new__(cls)
+        powerup.pos = [0, 0]
+        powerup.vel = [0, 0]
+        return powerup
+
+    def reset(self, x, y, power_type=None, rng=random):
+        self.pos[:] = x, y
         # Random velocity for item movement
-        self.vel = [random.uniform(-0.5, 0.5), random.uniform(0.5, 1.5)]
+        self.vel[:] = rng.uniform(-0.5, 0.5), rng.uniform(0.5, 1.5)
         if power_type is None:
-            self.type = random.choice([self.TYPE_WEAPON, self.TYPE_HEALTH, self.TYPE_SHIELD, self.TYPE_BOMB])
+            self.type = rng.choice(self.TYPES)
         else:
             self.type = power_type
 
@@ -548,77 +1593,1060 @@ class PowerUp:
         pygame.draw.rect(surface, color, (self.pos[0]-2, self.pos[1]-2, 5, 5))
 
 
-class Particle:
-    def __init__(self, x, y, vel_x, vel_y, color, size=2, lifetime=PARTICLE_LIFETIME):
-        self.pos = [x, y]
-        self.vel = [vel_x, vel_y]
-        self.color = color
-        self.size = size
-        self.lifetime = lifetime
-        self.max_lifetime = lifetime
+class ParticleSystem:
+    """Array-backed particle engine.
+
+    Every particle lives in one set of NumPy arrays; update() damps and ages
+    all of them in a single vectorized step and draw() rasterizes them in
+    bulk, grouped by their current square size. Emitters cover the effect
+    types the game uses (explosions, engine trails, spark/fragment bursts).
+    Particles are cosmetic, so they draw from their own RNG stream.
+    """
+
+    COLUMNS = ('x', 'y', 'vx', 'vy', 'size', 'lifetime', 'max_lifetime', 'color')
+    RNG_STATE = struct.Struct('<16s16s?I')  # PCG64 state, increment, buffered uint32
+
+    def __init__(self, capacity=512, seed=None, allocations=None):
+        self.count = 0
+        self.allocations = allocations
+        self.rng = np.random.default_rng(seed)
+        self.palette = []  # RGB tuples, indexed by self.color
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.size = np.zeros(capacity)
+        self.lifetime = np.zeros(capacity, dtype=np.int32)
+        self.max_lifetime = np.ones(capacity, dtype=np.int32)
+        self.color = np.zeros(capacity, dtype=np.uint8)
+
+    def __len__(self):
+        return self.count
+
+    def _color_index(self, color):
+        if color not in self.palette:
+            self.palette.append(color)
+        return self.palette.index(color)
+
+    def _reserve(self, n):
+        # Returns the slice for n new particles, growing the arrays if needed
+        needed = self.count + n
+        capacity = len(self.x)
+        if needed > capacity:
+            if self.allocations is not None:
+                self.allocations.add()
+            while capacity < needed:
+                capacity *= 2
+            for name in self.COLUMNS:
+                old = getattr(self, name)
+                new = np.zeros(capacity, dtype=old.dtype)
+                new[:self.count] = old[:self.count]
+                setattr(self, name, new)
+        rows = slice(self.count, needed)
+        self.count = needed
+        return rows
+
+    def _emit(self, x, y, vel_x, vel_y, color, size, lifetime):
+        rows = self._reserve(len(vel_x))
+        self.x[rows] = x
+        self.y[rows] = y
+        self.vx[rows] = vel_x
+        self.vy[rows] = vel_y
+        self.size[rows] = size
+        self.lifetime[rows] = lifetime
+        self.max_lifetime[rows] = lifetime
+        self.color[rows] = color
+
+    def emit_explosion(self, x, y, color, particle_count=20, size=1):
+        # Radial burst: random direction, speed 1-4, particle size 2-4 (scaled by size)
+        if particle_count <= 0:
+            return
+        angle = self.rng.uniform(0, 2 * math.pi, particle_count)
+        speed = self.rng.uniform(1, 4, particle_count) * size
+        particle_size = self.rng.integers(2, 5, particle_count) * size
+        self._emit(x, y, np.cos(angle) * speed, np.sin(angle) * speed,
+                   self._color_index(color), particle_size, PARTICLE_LIFETIME)
+
+    def emit_burst(self, x, y, color, count, spread, size=2, lifetime=PARTICLE_LIFETIME):
+        # Sparks, fragments and debris: count particles per point with velocity in +-spread.
+        # x and y may be arrays to burst at many points at once.
+        if np.ndim(x):
+            x = np.repeat(x, count)
+            y = np.repeat(y, count)
+            count = len(x)
+        if count <= 0:
+            return
+        vel_x = self.rng.uniform(-spread, spread, count)
+        vel_y = self.rng.uniform(-spread, spread, count)
+        self._emit(x, y, vel_x, vel_y, self._color_index(color), size, lifetime)
 
-    def update(self):
-        self.pos[0] += self.vel[0]
-        self.pos[1] += self.vel[1]
-        self.vel[0] *= 0.95
-        self.vel[1] *= 0.95
-        self.lifetime -= 1
-        return self.lifetime > 0
+    def emit_trail(self, x, y, angle, thrust, colors, size=2, lifetime=15):
+        # Engine exhaust: one particle behind the ship, half the time
+        if self.rng.random() >= 0.5:
+            return
+        rad = math.radians(angle + 180)
+        jitter_x, jitter_y = self.rng.uniform(-0.5, 0.5, 2)
+        vel_x = math.cos(rad) * thrust * 0.5 + jitter_x
+        vel_y = math.sin(rad) * thrust * 0.5 + jitter_y
+        color = colors[self.rng.integers(len(colors))]
+        self._emit(x + math.cos(rad) * 10, y + math.sin(rad) * 10, np.array([vel_x]), np.array([vel_y]),
+                   self._color_index(color), size, lifetime)
 
-    def draw(self, surface):
-        alpha_ratio = self.lifetime / self.max_lifetime
-        current_size = max(1, int(self.size * alpha_ratio))
-        pygame.draw.rect(surface, self.color, (int(self.pos[0]), int(self.pos[1]), current_size, current_size))
-
-
-class Explosion:
-    def __init__(self, x, y, color, particle_count=20, size=1):
-        self.particles = []
-        for _ in range(particle_count):
-            angle = random.uniform(0, 2 * math.pi)
-            speed = random.uniform(1, 4) * size
-            vel_x = math.cos(angle) * speed
-            vel_y = math.sin(angle) * speed
-            particle_size = random.randint(2, 4) * size
-            self.particles.append(Particle(x, y, vel_x, vel_y, color, particle_size))
+    def clear(self):
+        self.count = 0
 
     def update(self):
-        self.particles = [p for p in self.particles if p.update()]
-        return len(self.particles) > 0
+        n = self.count
+        if n == 0:
+            return
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.vx[:n] *= 0.95
+        self.vy[:n] *= 0.95
+        self.lifetime[:n] -= 1
+        alive = self.lifetime[:n] > 0
+        if not alive.all():
+            k = int(np.count_nonzero(alive))
+            for arr in (self.x, self.y, self.vx, self.vy, self.size, self.lifetime, self.max_lifetime, self.color):
+                arr[:k] = arr[:n][alive]
+            self.count = k
 
     def draw(self, surface):
-        for p in self.particles:
-            p.draw(surface)
+        n = self.count
+        if n == 0:
+            return
+        # Particles shrink with age
+        current_size = np.maximum(1, (self.size[:n] * self.lifetime[:n] / self.max_lifetime[:n]).astype(np.intp))
+        mapped = np.array([surface.map_rgb(c) for c in self.palette], dtype=np.uint32)
+        colors = mapped[self.color[:n]]
+        x, y = self.x[:n], self.y[:n]
+        for size in np.unique(current_size).tolist():
+            group = current_size == size
+            draw_squares(surface, x[group], y[group], size, colors[group])
+
+    def seed(self, seed):
+        self.rng = np.random.default_rng(seed)
+
+    def pack(self):
+        n = self.count
+        state = self.rng.bit_generator.state
+        parts = [struct.pack('<IB', n, len(self.palette)),
+                 np.array(self.palette, dtype=np.uint8).tobytes(),
+                 self.RNG_STATE.pack(state['state']['state'].to_bytes(16, 'little'),
+                                     state['state']['inc'].to_bytes(16, 'little'),
+                                     bool(state['has_uint32']), state['uinteger'])]
+        parts.extend(getattr(self, name)[:n].tobytes() for name in self.COLUMNS)
+        return b''.join(parts)
+
+    def unpack(self, data, offset):
+        # Returns the offset just past this system
+        n, colors = struct.unpack_from('<IB', data, offset)
+        offset += 5
+        palette = np.frombuffer(data, np.uint8, colors * 3, offset).reshape(colors, 3)
+        self.palette = [tuple(color) for color in palette.tolist()]
+        offset += colors * 3
+        rng_state, inc, has_uint32, uinteger = self.RNG_STATE.unpack_from(data, offset)
+        offset += self.RNG_STATE.size
+        self.rng.bit_generator.state = {
+            'bit_generator': 'PCG64',
+            'state': {'state': int.from_bytes(rng_state, 'little'), 'inc': int.from_bytes(inc, 'little')},
+            'has_uint32': int(has_uint32), 'uinteger': uinteger}
+        self.count = 0
+        self._reserve(n)
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[:n] = np.frombuffer(data, column.dtype, n, offset)
+            offset += n * column.itemsize
+        return offset
+
+    def extent(self):
+        # Largest square any live particle can draw this frame
+        n = self.count
+        return max(1, int(np.ceil(self.size[:n].max()))) if n else 0
+
+
+class SpatialHash:
+    """Uniform grid broadphase over the WIDTH x HEIGHT world.
+
+    rebuild() buckets points by cell with one stable sort, so items are
+    referred to by index and each cell lists them in ascending order.
+    Points outside the world clamp into the border cells, which keeps
+    queries conservative for entities that spawn off-screen.
+    """
+
+    def __init__(self, cell_size=COLLISION_CELL_SIZE, width=WIDTH, height=HEIGHT):
+        self.cell_size = cell_size
+        self.cols = -(-width // cell_size)
+        self.rows = -(-height // cell_size)
+        self.cell_ids = np.arange(self.cols * self.rows + 1)
+        self.count = 0
+        self.order = []
+        self.starts = []
+
+    def rebuild(self, xs, ys):
+        self.count = len(xs)
+        if self.count == 0:
+            return
+        cs = self.cell_size
+        cols = np.minimum(np.maximum((xs // cs).astype(np.intp), 0), self.cols - 1)
+        rows = np.minimum(np.maximum((ys // cs).astype(np.intp), 0), self.rows - 1)
+        cells = rows * self.cols + cols
+        order = np.argsort(cells, kind='stable')
+        # Plain lists: per-query slicing is much cheaper than on small arrays
+        self.starts = np.searchsorted(cells[order], self.cell_ids).tolist()
+        self.order = order.tolist()
+
+    def query(self, x, y, radius):
+        # Candidate indices (ascending) for items whose center may lie within radius
+        if self.count == 0:
+            return ()
+        cs, cols, rows = self.cell_size, self.cols, self.rows
+        x0 = min(max(int((x - radius) // cs), 0), cols - 1)
+        x1 = min(max(int((x + radius) // cs), 0), cols - 1)
+        y0 = min(max(int((y - radius) // cs), 0), rows - 1)
+        y1 = min(max(int((y + radius) // cs), 0), rows - 1)
+        starts, order = self.starts, self.order
+        if y0 == y1 and x0 == x1:
+            c = y0 * cols + x0
+            return order[starts[c]:starts[c + 1]]
+        # Cells of one row are contiguous in the sorted order
+        candidates = []
+        for row in range(y0, y1 + 1):
+            base = row * cols
+            candidates.extend(order[starts[base + x0]:starts[base + x1 + 1]])
+        candidates.sort()
+        return candidates
+
+
+class TargetIndex:
+    """Nearest-target queries over one frame's entities.
+
+    build() copies the items' positions and a key attribute (enemy tier,
+    powerup type) into arrays. Queries compare squared
+    distances with argmin/argpartition and return items, so the list the
+    index was built from is never sorted or reordered. Ties go to the
+    earlier item, as with a stable sort.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.items = []
+        self.pos = np.empty((0, 2))
+        self.keys = np.empty(0)
+
+    def __len__(self):
+        return len(self.items)
+
+    def build(self, items):
+        self.items = list(items)
+        self.pos = np.array([item.pos for item in items], dtype=float).reshape(-1, 2)
+        self.keys = np.array([getattr(item, self.key) for item in items])
+
+    def distances_sq(self, x, y):
+        dx = self.pos[:, 0] - x
+        dy = self.pos[:, 1] - y
+        return dx * dx + dy * dy
+
+    def nearest(self, x, y, key=None):
+        # Nearest item, only among items with this key if given; None if there is none
+        if not self.items:
+            return None
+        d2 = self.distances_sq(x, y)
+        if key is not None:
+            d2[self.keys != key] = np.inf
+        i = int(np.argmin(d2))
+        return self.items[i] if d2[i] < np.inf else None
+
+    def within(self, x, y, radius):
+        # Items closer than radius, in list order
+        if not self.items:
+            return []
+        inside = np.flatnonzero(self.distances_sq(x, y) < radius * radius)
+        return [self.items[i] for i in inside.tolist()]
+
+    def weakest_within(self, x, y, radius):
+        # Lowest-key item closer than radius, the nearest of those; None if there is none
+        if not self.items:
+            return None
+        d2 = self.distances_sq(x, y)
+        inside = d2 < radius * radius
+        if not inside.any():
+            return None
+        d2[~inside | (self.keys != self.keys[inside].min())] = np.inf
+        return self.items[int(np.argmin(d2))]
+
+    def k_nearest(self, x, y, k):
+        # Up to k items, nearest first; only the k chosen are ordered
+        n = len(self.items)
+        if k <= 0 or n == 0:
+            return []
+        d2 = self.distances_sq(x, y)
+        if k < n:
+            # Everything closer than the kth distance, then the earliest ties at it
+            kth = np.partition(d2, k - 1)[k - 1]
+            closer = np.flatnonzero(d2 < kth)
+            chosen = np.concatenate((closer, np.flatnonzero(d2 == kth)[:k - len(closer)]))
+        else:
+            chosen = np.arange(n)
+        chosen = chosen[np.argsort(d2[chosen], kind='stable')]
+        return [self.items[i] for i in chosen.tolist()]
+
+
+class InfluenceMap:
+    """Coarse danger field over the world, drawn as the F2 debug overlay.
+
+    Threats are binned by cell into a threat-weighted density grid that
+    extends a perception radius past the world edges, so off-screen
+    threats still count. The danger field (the sum of threat / (d^2 + 1)
+    over threats in range) is that density convolved with a fixed kernel,
+    recomputed by one FFT per update. Only the overlay updates it; the
+    autopilot steers by the exact per-threat sum, which is cheaper.
+    """
+
+    def __init__(self, cell_size=INFLUENCE_CELL_SIZE, width=WIDTH, height=HEIGHT):
+        self.cell_size = cell_size
+        self.cols = -(-width // cell_size)
+        self.rows = -(-height // cell_size)
+        self.radius = None
+        self.reach = 0  # Kernel radius in cells
+        self.field = np.zeros((self.rows, self.cols))
+        self.update_ms = 0.0
+
+    def set_radius(self, radius):
+        cs = self.cell_size
+        self.radius = radius
+        r = self.reach = int(radius // cs) + 1
+        offsets = np.arange(-r, r + 1) * cs
+        dist = np.hypot(*np.meshgrid(offsets, offsets))
+        kernel = np.where(dist < radius, 1 / (dist * dist + 1), 0)
+        self.fft_shape = (self.rows + 4 * r, self.cols + 4 * r)  # Linear, not circular, convolution
+        self.kernel_spectrum = np.fft.rfft2(kernel, self.fft_shape)
+
+    def clear(self):
+        self.field[:] = 0
+
+    def update(self, xs, ys, weights, radius):
+        start = time.perf_counter()
+        if radius != self.radius:
+            self.set_radius(radius)
+        cs, r = self.cell_size, self.reach
+        h, w = self.rows + 2 * r, self.cols + 2 * r
+        cols = (xs // cs).astype(np.intp) + r
+        rows = (ys // cs).astype(np.intp) + r
+        keep = (cols >= 0) & (cols < w) & (rows >= 0) & (rows < h)
+        density = np.bincount(rows[keep] * w + cols[keep], weights[keep], minlength=h * w).reshape(h, w)
+        if density.any():
+            full = np.fft.irfft2(np.fft.rfft2(density, self.fft_shape) * self.kernel_spectrum, self.fft_shape)
+            span = 2 * r
+            self.field[:] = full[span:span + self.rows, span:span + self.cols]
+        else:
+            self.field[:] = 0
+        self.update_ms = (time.perf_counter() - start) * 1000
+
+    def danger(self, x, y):
+        # Bilinear danger at a point
+        cs = self.cell_size
+        gx = min(max(x / cs - 0.5, 0), self.cols - 1)
+        gy = min(max(y / cs - 0.5, 0), self.rows - 1)
+        c0 = min(int(gx), self.cols - 2)
+        r0 = min(int(gy), self.rows - 2)
+        fx, fy = gx - c0, gy - r0
+        f = self.field
+        top = f[r0, c0] * (1 - fx) + f[r0, c0 + 1] * fx
+        bottom = f[r0 + 1, c0] * (1 - fx) + f[r0 + 1, c0 + 1] * fx
+        return float(top * (1 - fy) + bottom * fy)
+
+    def draw(self, surface):
+        # Danger as a red glow, log-scaled so distant threats still show
+        danger = np.log1p(np.maximum(self.field, 0) * 200)
+        peak = danger.max()
+        if peak <= 0:
+            return
+        heat = np.zeros((self.cols, self.rows, 3), dtype=np.uint8)
+        heat[:, :, 0] = (danger.T * (160 / peak)).astype(np.uint8)
+        heat[:, :, 2] = heat[:, :, 0] // 3
+        cs = self.cell_size
+        overlay = pygame.transform.scale(pygame.surfarray.make_surface(heat), (self.cols * cs, self.rows * cs))
+        surface.blit(overlay, (0, 0), special_flags=pygame.BLEND_ADD)
+
+
+class ThreatForecast:
+    """Closest approach of every threat to the player over the next frames.
+
+    predict() assumes the player keeps its current heading and thrust
+    (ignoring screen wrap) and moves each threat by its own update rule.
+    Asteroids and plain enemy bullets fly straight, so their closest
+    approach is solved in closed form, cut off where they leave the world.
+    Homing bullets and enemies turn towards the player every frame; those
+    that can get within PREDICTION_NEAR are stepped frame by frame (as
+    arrays, or in a plain loop when there are only a few), nearest first,
+    as many as the budget affords and at most steered_limit of them. The
+    rest keep the straight-line estimate along their current heading.
+    Homing bullets are only followed until they expire.
+
+    Results are aligned with Game.gather_threats() without the boss: time
+    is the frames until closest approach, miss the distance then and
+    offset the vector from the threat to the player then, as x + iy.
+    budget_us is enforced by estimating each call's cost from its threat
+    counts (the PREDICTION_*_US costs), not by reading the clock, so the
+    result never depends on timing and replays are unaffected. Every call
+    is still timed, and calls that took longer than budget_us anyway are
+    counted in over_budget.
+    """
+
+    def __init__(self, frames=PREDICTION_FRAMES, budget_us=PREDICTION_BUDGET_US,
+                 steered_limit=PREDICTION_STEERED_LIMIT):
+        self.frames = frames
+        self.budget_us = budget_us
+        self.steered_limit = steered_limit
+        self.time = np.empty(0)
+        self.miss = np.empty(0)
+        self.offset = np.empty(0, dtype=complex)
+        self.stepped = 0  # Steered threats stepped by the last call
+        self.last_us = 0.0
+        self.peak_us = 0.0
+        self.total_us = 0.0
+        self.runs = 0
+        self.over_budget = 0  # Calls that took longer than budget_us
+
+    @property
+    def mean_us(self):
+        return self.total_us / self.runs if self.runs else 0.0
+
+    def report(self):
+        return (f"Forecast {self.last_us:.0f} us (mean {self.mean_us:.0f}, peak {self.peak_us:.0f}, "
+                f"budget {self.budget_us})  stepped {self.stepped}  over {self.over_budget}/{self.runs}")
+
+    def predict(self, player, enemies, asteroids, bullets, current_time):
+        # Positions and velocities are complex numbers (x + iy) throughout
+        start = time.perf_counter()
+        frames = self.frames
+        n_enemies = len(enemies)
+        first_bullet = n_enemies + len(asteroids)
+        nb = bullets.count
+        n = first_bullet + nb
+        player_pos = complex(*player.pos)
+        rad = math.radians(player.angle)
+        player_vel = complex(player.thrust * math.cos(rad), player.thrust * math.sin(rad))
+
+        # Position, per-frame velocity, speed and frames left in the world of every threat
+        pos = np.empty(n, dtype=complex)
+        vel = np.empty(n, dtype=complex)
+        speed = np.zeros(n)
+        life = np.full(n, float(frames))
+        heading = np.zeros(n_enemies)
+        if n_enemies:
+            state = np.array([(e.pos[0], e.pos[1], e.angle, e.speed) for e in enemies])
+            heading = np.radians(state[:, 2])
+            speed[:n_enemies] = state[:, 3]
+            pos[:n_enemies] = state[:, 0] + 1j * state[:, 1]
+            vel[:n_enemies] = speed[:n_enemies] * np.exp(1j * heading)
+        if asteroids:
+            state = np.array([(a.pos[0], a.pos[1], a.vel[0], a.vel[1]) for a in asteroids])
+            pos[n_enemies:first_bullet] = state[:, 0] + 1j * state[:, 1]
+            vel[n_enemies:first_bullet] = state[:, 2] + 1j * state[:, 3]
+        homing = np.zeros(nb, dtype=bool)
+        if nb:
+            pos[first_bullet:] = bullets.x[:nb] + 1j * bullets.y[:nb]
+            vel[first_bullet:] = bullets.vx[:nb] + 1j * bullets.vy[:nb]
+            homing = bullets.tier[:nb] >= 4
+            if homing.any():
+                # Homing bullets head for the player at a fixed speed until they expire
+                rows = np.flatnonzero(homing) + first_bullet
+                toward = player_pos - pos[rows]
+                vel[rows] = toward * (HOMING_BULLET_SPEED / np.maximum(np.abs(toward), 1e-9))
+                speed[rows] = HOMING_BULLET_SPEED
+                age = current_time - bullets.birth[:nb][homing]
+                life[rows] = np.minimum(np.maximum((HOMING_BULLET_LIFETIME - age) * FPS / 1000, 0), frames)
+        if n > n_enemies:
+            # Straight movers leave the world (asteroids a margin past its edges)
+            margin = np.zeros(n - n_enemies)
+            margin[:len(asteroids)] = ASTEROID_SPAWN_MARGIN
+            movers = slice(n_enemies, n)
+            life[movers] = np.minimum(life[movers], np.minimum(
+                self.exit_time(pos[movers].real, vel[movers].real, -margin, WIDTH + margin),
+                self.exit_time(pos[movers].imag, vel[movers].imag, -margin, HEIGHT + margin)))
+
+        # Straight-line closest approach of every threat relative to the player
+        rel_pos = player_pos - pos
+        rel_vel = player_vel - vel
+        vv = rel_vel.real * rel_vel.real + rel_vel.imag * rel_vel.imag
+        t = np.minimum(np.maximum(-(rel_pos * rel_vel.conj()).real / np.maximum(vv, 1e-12), 0), life)
+        closest = rel_pos + t * rel_vel
+        miss = np.abs(closest)
+
+        # Step the steered threats that can get close
+        steered = np.concatenate((np.arange(n_enemies), np.flatnonzero(homing) + first_bullet))
+        if steered.size:
+            start_dist = np.abs(rel_pos[steered])
+            reach = (speed[steered] + player.thrust) * life[steered]
+            near = start_dist - reach < PREDICTION_NEAR
+            steered, start_dist = steered[near], start_dist[near]
+            steered = steered[np.argsort(start_dist, kind='stable')]
+            steered = steered[:self.affordable(np.floor(life[steered]), n)]
+            if steered.size:
+                self.step(steered, n_enemies, heading, speed, life, rel_pos, player_vel, t, miss, closest)
+        self.stepped = steered.size
+
+        self.time = t
+        self.miss = miss
+        self.offset = closest
+        self.last_us = (time.perf_counter() - start) * 1e6
+        self.peak_us = max(self.peak_us, self.last_us)
+        self.total_us += self.last_us
+        self.runs += 1
+        self.over_budget += self.last_us > self.budget_us
+
+    def affordable(self, stops, n):
+        # How many of the steered threats, nearest first, can be stepped
+        # (to their stop frames) within budget_us by the cost estimates
+        budget = self.budget_us - PREDICTION_BASE_US - PREDICTION_THREAT_US * n
+        threat_frames = np.cumsum(stops)
+        each = threat_frames * PREDICTION_EACH_US
+        batch = np.maximum.accumulate(stops) * PREDICTION_BATCH_FRAME_US + threat_frames * PREDICTION_BATCH_THREAT_US
+        cost = np.where(np.arange(1, len(stops) + 1) < PREDICTION_BATCH_MIN, each, batch)
+        fits = np.flatnonzero(cost <= budget)
+        return min(int(fits[-1]) + 1 if fits.size else 0, self.steered_limit)
+
+    @staticmethod
+    def exit_time(x, v, low, high):
+        # Frames until each coordinate x moving at v leaves (low, high)
+        edge = np.where(v > 0, high, low)
+        moving = v != 0
+        t = np.full(len(x), np.inf)
+        np.divide(edge - x, v, out=t, where=moving)
+        return np.maximum(t, 0)
+
+    def step(self, steered, n_enemies, heading, speed, life, rel_pos, player_vel, t, miss, closest):
+        # Simulate the steered threats frame by frame and overwrite their t,
+        # miss and closest. The distance for frame k is the one the game
+        # tests for contact: enemies before their move (as Enemy.update
+        # returns it), bullets after theirs; a homing bullet moves straight
+        # at the player, so its gap is the enemy-style distance less its speed.
+        is_enemy = steered < n_enemies
+        angle = np.angle(rel_pos[steered])
+        angle[is_enemy] = heading[steered[is_enemy]]
+        # Enemies turn at most ENEMY_ROTATION_SPEED a frame, homing bullets any amount
+        turn = np.where(is_enemy, math.radians(ENEMY_ROTATION_SPEED), math.pi)
+        v = speed[steered]
+        shrink = np.where(is_enemy, 0.0, v)
+        walk = self.walk_each if len(steered) < PREDICTION_BATCH_MIN else self.walk_batch
+        t[steered], miss[steered], closest[steered] = walk(
+            rel_pos[steered], angle, turn, v, shrink, np.floor(life[steered]).astype(int), player_vel)
+
+    @staticmethod
+    def walk_batch(d, angle, turn, v, shrink, stop, player_vel):
+        # d is the vector from each threat to the player; every threat is
+        # stepped to the latest stop and frames past its own are ignored
+        steps = int(stop.max())
+        ds = np.empty((steps + 1, len(d)), dtype=complex)
+        ds[0] = d
+        for k in range(1, steps + 1):
+            d += player_vel
+            ds[k] = d
+            diff = (np.angle(d) - angle + math.pi) % (2 * math.pi) - math.pi
+            angle += np.minimum(np.maximum(diff, -turn), turn)
+            d -= v * np.exp(1j * angle)
+        dists = np.abs(ds)
+        gaps = np.abs(dists - shrink)
+        gaps[0] = dists[0]
+        gaps[np.arange(steps + 1)[:, None] > stop] = np.inf
+        best = np.argmin(gaps, axis=0)
+        cols = np.arange(len(d))
+        miss = gaps[best, cols]
+        return best, miss, ds[best, cols] / np.maximum(dists[best, cols], 1e-9) * miss
+
+    @staticmethod
+    def walk_each(d, angle, turn, v, shrink, stop, player_vel):
+        # walk_batch() one threat at a time, cheaper for a handful of threats
+        times, misses, closests = [], [], []
+        for d, angle, turn, v, shrink, stop in zip(d.tolist(), angle.tolist(), turn.tolist(), v.tolist(),
+                                                   shrink.tolist(), stop.tolist()):
+            best_k, best, best_d = 0, abs(d), d
+            for k in range(1, stop + 1):
+                d += player_vel
+                gap = abs(abs(d) - shrink)
+                if gap < best:
+                    best_k, best, best_d = k, gap, d
+                diff = (cmath.phase(d) - angle + math.pi) % (2 * math.pi) - math.pi
+                angle += min(max(diff, -turn), turn)
+                d -= v * complex(math.cos(angle), math.sin(angle))
+            times.append(best_k)
+            misses.append(best)
+            closests.append(best_d / max(abs(best_d), 1e-9) * best)
+        return times, misses, closests
+
+
+class ManeuverScript:
+    """Flies a sequence of planner maneuvers, each for `commit` autopilot
+    frames (once, for loops and bombs), then leaves the reactive autopilot
+    in charge."""
+
+    def __init__(self, names, commit=PLANNER_COMMIT):
+        self.names = names
+        self.commit = commit
+        self.calls = 0
+
+    def maneuver(self, game):
+        # The maneuver to fly this autopilot frame, or None for update_ai's own
+        window, k = divmod(self.calls, self.commit)
+        self.calls += 1
+        if window >= len(self.names):
+            return None
+        name = self.names[window]
+        if name == 'auto' or (k and name in ONE_SHOT_MANEUVERS):
+            return None
+        return name
+
+
+class LookaheadPlanner:
+    """Chooses the autopilot's maneuvers by playing candidates out in a
+    headless clone of the game and keeping the one with the best value.
+
+    Without a time budget each plan starts from the current state and runs
+    to completion. With one, planning is pipelined: while one maneuver is
+    flown, the next is chosen by rollouts that fly it from the state at its
+    start and then each candidate, stepped a frame at a time within each
+    frame's budget. Rollouts left unfinished at the end of the window don't
+    count.
+    """
+
+    def __init__(self, budget_ms=PLANNER_BUDGET_MS, workers=0, horizon=PLANNER_HORIZON,
+                 commit=PLANNER_COMMIT, samples=PLANNER_SAMPLES):
+        # budget_ms=None makes plans independent of timing (needed for
+        # reproducible headless games). With workers, rollouts run whole in
+        # that many processes instead of in the planner's clone.
+        self.budget_ms = budget_ms
+        self.workers = workers
+        self.horizon = horizon
+        self.commit = commit
+        self.samples = samples
+        self.clone = None  # Created on first use, with the game's AI parameters
+        self.pool = None
+        # Plan number shared with the workers, so rollouts of a plan that is
+        # over stop early instead of holding up the next plan's
+        self.generation = None
+        self.script = ManeuverScript([], commit)
+
+        # Plan in progress: the state it starts from, its rollouts and their
+        # values, and how far the clone is into the current rollout
+        self.snapshot = None
+        self.tasks = []
+        self.results = []
+        self.task = 0
+        self.start = None
+        self.frame = 0
+
+        # Results of the last plan, and time spent per autopilot frame
+        self.values = {}  # Maneuver -> mean rollout value
+        self.choice = 'auto'
+        self.rollouts = 0
+        self.skipped = 0
+        self.plans = 0
+        self.cut = 0  # Plans the budget cut short
+        self.last_ms = 0.0
+        self.peak_ms = 0.0
+        self.total_ms = 0.0
+        self.frames = 0
+
+    @property
+    def mean_ms(self):
+        return self.total_ms / self.frames if self.frames else 0.0
+
+    def report(self):
+        values = '  '.join(f"{name} {value:.0f}" for name, value in self.values.items())
+        return (f"{self.last_ms:.1f} ms/frame (mean {self.mean_ms:.1f}, peak {self.peak_ms:.1f}), "
+                f"{self.rollouts} rollouts, {self.skipped} skipped, cut {self.cut}/{self.plans}: "
+                f"{self.choice} <- {values}")
+
+    def maneuver(self, game):
+        # Game.planner interface, called every autopilot frame
+        began = time.perf_counter()
+        if self.script.calls >= self.commit * len(self.script.names):
+            if self.budget_ms is None:
+                self.start_plan(game, ())
+                self.work(began)
+                self.choose()
+            else:
+                if self.snapshot is not None:
+                    self.choose()
+                self.start_plan(game, (self.choice,))
+            self.script = ManeuverScript([self.choice], self.commit)
+        if self.budget_ms is not None:
+            self.work(began)
+        elapsed = (time.perf_counter() - began) * 1000
+        self.last_ms = elapsed
+        self.peak_ms = max(self.peak_ms, elapsed)
+        self.total_ms += elapsed
+        self.frames += 1
+        return self.script.maneuver(game)
+
+    def candidates(self, game):
+        # 'auto' goes first so even a plan cut short has an answer
+        player = game.player
+        names = ['auto', 'left', 'right', 'thrust', 'brake']
+        if not player.is_looping and game.clock.get_ticks() - player.last_loop_time > LOOP_COOLDOWN:
+            names.append('loop')
+        if player.bombs > 0:
+            names.append('bomb')
+        return names
+
+    def start_plan(self, game, lead):
+        # Rollouts fly the lead maneuvers, then a candidate, then the
+        # reactive autopilot to the end of the horizon
+        self.snapshot = game.snapshot()
+        frames = self.commit * (len(lead) + 1) + self.horizon - self.commit
+        # Every candidate sees the same futures (common random numbers), drawn
+        # from the game's seed and frame rather than the game's own streams,
+        # which would let rollouts see what the real game will roll next
+        seeds = [(game.seed * 1000003 + game.clock.frame * 101 + sample) & 0xFFFFFFFF
+                 for sample in range(self.samples)]
+        self.tasks = [(lead + (name,), seed, frames) for seed in seeds for name in self.candidates(game)]
+        self.results = [None] * len(self.tasks)
+        self.task = 0
+        self.start = None
+        if self.workers:
+            if self.pool is None:
+                self.generation = multiprocessing.RawValue('L', 0)
+                self.pool = concurrent.futures.ProcessPoolExecutor(
+                    self.workers, initializer=_init_rollout_worker,
+                    initargs=(game.ai_params, game.strategy_interval, self.generation))
+            generation = self.generation.value
+            self.results = [self.pool.submit(_rollout_worker, self.snapshot, names, seed, frames, self.commit,
+                                             generation)
+                            for names, seed, frames in self.tasks]
+        elif self.clone is None:
+            self.clone = Game(headless=True, ai_params=game.ai_params, strategy_interval=game.strategy_interval)
+
+    def work(self, began):
+        # Anytime: step the plan's rollouts until this frame's budget is spent
+        if self.workers:
+            if self.budget_ms is None:
+                concurrent.futures.wait(self.results)
+            return
+        clone = self.clone
+        while self.task < len(self.tasks):
+            if self.budget_ms is not None and (time.perf_counter() - began) * 1000 >= self.budget_ms:
+                return
+            names, seed, frames = self.tasks[self.task]
+            if self.start is None:
+                self.start = self.begin_rollout(clone, self.snapshot, names, seed, self.commit)
+                self.frame = 0
+            clone.step()
+            self.frame += 1
+            if self.frame >= frames or clone.state != STATE_PLAYING:
+                self.results[self.task] = self.rollout_value(clone, self.start, self.frame, frames)
+                self.task += 1
+                self.start = None
+
+    def choose(self):
+        # Best mean value over the finished rollouts; ties keep the earlier candidate
+        totals = {}
+        for (names, _, _), result in zip(self.tasks, self.results):
+            if isinstance(result, concurrent.futures.Future):
+                result = result.result() if result.done() and not result.cancelled() else None
+            if result is not None:
+                total, count = totals.get(names[-1], (0.0, 0))
+                totals[names[-1]] = (total + result, count + 1)
+        self.values = {name: total / count for name, (total, count) in totals.items()}
+        self.choice = max(self.values, key=self.values.get) if self.values else 'auto'
+        self.rollouts = sum(count for _, count in totals.values())
+        self.skipped = len(self.tasks) - self.rollouts
+        self.cut += self.skipped > 0
+        self.plans += 1
+        if self.workers:
+            # Queued rollouts are cancelled; running ones see the new
+            # generation and return at their next frame
+            self.generation.value += 1
+            for future in self.results:
+                future.cancel()
+
+    def close(self):
+        # Stops the rollout workers; also called on leaving a with block
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def begin_rollout(clone, snapshot, names, seed, commit):
+        clone.restore(snapshot)
+        clone.streams.seed(seed)
+        clone.planner = ManeuverScript(names, commit)
+        return clone.score, clone.player.hp + clone.player.shield, clone.player.bombs
+
+    @staticmethod
+    def rollout_value(clone, start, frame, frames):
+        # Score gained, health and bombs kept, and a penalty for dying that
+        # grows the sooner it happens
+        score, health, bombs = start
+        player = clone.player
+        value = (clone.score - score + PLANNER_HEALTH_VALUE * (player.hp + player.shield - health)
+                 + PLANNER_BOMB_VALUE * (player.bombs - bombs))
+        if clone.state == STATE_GAME_OVER:
+            value -= PLANNER_DEATH_PENALTY * (2 - frame / frames)
+        return value
+
+    @classmethod
+    def rollout(cls, clone, snapshot, names, seed, frames, commit, stale=None):
+        # stale() is checked every frame; once it's true the rollout is
+        # abandoned and None returned
+        start = cls.begin_rollout(clone, snapshot, names, seed, commit)
+        frame = 0
+        while frame < frames and clone.state == STATE_PLAYING:
+            if stale is not None and stale():
+                return None
+            clone.step()
+            frame += 1
+        return cls.rollout_value(clone, start, frame, frames)
+
+
+# Rollout clone of a planner worker process, and the planner's shared plan number
+_rollout_game = None
+_rollout_generation = None
+
+
+def _init_rollout_worker(ai_params, strategy_interval, generation):
+    global _rollout_game, _rollout_generation
+    _rollout_game = Game(headless=True, ai_params=ai_params, strategy_interval=strategy_interval)
+    _rollout_generation = generation
+
+
+def _rollout_worker(snapshot, names, seed, frames, commit, generation):
+    return LookaheadPlanner.rollout(_rollout_game, snapshot, names, seed, frames, commit,
+                                    stale=lambda: _rollout_generation.value != generation)
+
+
+class PolicyTable:
+    """The reactive autopilot distilled into a lookup table (written by
+    distill_policy.py): each quantized situation maps to the action update_ai
+    took most often in it. Situations missing from the table are left to
+    update_ai. Only tables marked web are loaded by the web build."""
+
+    def __init__(self, keys=(), actions=(), web=False):
+        self.table = dict(zip(keys, actions))
+        self.web = web
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['keys'].tolist(), data['actions'].tolist(), 'web' in data and bool(data['web']))
+
+    def digest(self):
+        # Short hash of the table's contents, for replays to name it by
+        keys = np.array(list(self.table), dtype=np.int64)
+        actions = np.array(list(self.table.values()), dtype=np.uint8)
+        order = np.argsort(keys)
+        return hashlib.sha1(keys[order].tobytes() + actions[order].tobytes()).hexdigest()[:16]
+
+    def save(self, path):
+        np.savez_compressed(path, keys=np.array(list(self.table), dtype=np.int64),
+                            actions=np.array(list(self.table.values()), dtype=np.uint8), web=self.web)
+
+    @staticmethod
+    def situation(game, away, dist):
+        # Key of the player's surroundings, from update_ai's away and dist
+        # arrays: the closest threat's range band in each heading-relative
+        # sector, the nearest enemy's bearing and range, which of
+        # update_ai's bomb and loop triggers hold, health, shield, and loop
+        # and bomb readiness
+        params = game.ai_params
+        player = game.player
+        n_enemies = len(game.enemies)
+        first_bullet = n_enemies + len(game.asteroids)
+        end_bullet = first_bullet + game.enemy_bullets.count
+        nearby_enemies = int(np.count_nonzero(dist[:n_enemies] < params['nearby_enemy_radius']))
+        nearby_bullets = int(np.count_nonzero(dist[first_bullet:end_bullet] < params['nearby_bullet_radius']))
+
+        # Sector bands, raised in increasing order so each sector keeps its highest
+        seen = dist < params['perception_radius']
+        toward = -away[seen]
+        near = dist[seen]
+        heading = math.radians(player.angle) - math.pi / POLICY_SECTORS  # Start of sector 0
+        sector = ((np.arctan2(toward[:, 1], toward[:, 0]) - heading)
+                  * (POLICY_SECTORS / math.tau) % POLICY_SECTORS).astype(np.intp)
+        bands = np.zeros(POLICY_SECTORS, dtype=np.int64)
+        bands[sector] = 1
+        bands[sector[near < params['nearby_bullet_radius']]] = 2
+        bands[sector[near < params['emergency_dodge_radius']]] = 3
+        key = int(bands @ POLICY_BAND_WEIGHTS)
+
+        # Bearing and range band of the nearest enemy or the boss; bearing
+        # len(POLICY_BEARINGS) + 1 if there is neither
+        bearing = len(POLICY_BEARINGS) + 1
+        distance = 0
+        if n_enemies or end_bullet < len(dist):
+            target = int(np.argmin(dist[:n_enemies])) if n_enemies else end_bullet
+            if end_bullet < len(dist) and dist[end_bullet] < dist[target]:
+                target = end_bullet
+            x, y = away[target].tolist()
+            angle = (math.degrees(math.atan2(-y, -x)) - player.angle + 180) % 360 - 180
+            bearing = bisect.bisect(POLICY_BEARINGS, angle)
+            optimal = params['boss_optimal_dist'] if game.boss is not None else params['optimal_dist']
+            d = dist[target]
+            distance = 0 if d < optimal - 30 else 1 if d <= optimal else 2
+
+        # The autopilot's bomb and loop triggers, when they could fire
+        hp_ratio = player.hp / player.max_hp
+        loop_ready = (not player.is_looping
+                      and game.clock.get_ticks() - player.last_loop_time > LOOP_COOLDOWN)
+        danger = nearby_bullets * 2 + nearby_enemies
+        triggers = 0
+        if player.bombs > 0:
+            triggers = ((hp_ratio <= params['bomb_hp_ratio'] and danger >= params['bomb_danger'])
+                        or nearby_bullets >= params['bomb_bullets'])
+        if loop_ready:
+            triggers += 2 * (danger >= params['loop_danger'] or nearby_bullets >= params['loop_bullets'])
+        health = 0 if hp_ratio <= params['bomb_hp_ratio'] else 1 if hp_ratio <= 0.5 else 2
+
+        key = ((key * (len(POLICY_BEARINGS) + 2) + bearing) * 3 + distance) * 4 + triggers
+        key = ((key * 3 + health) * 2 + (player.shield > 0)) * 2 + loop_ready
+        return key * 2 + (player.bombs > 0)
+
+    @staticmethod
+    def encode(turn, thrust_change, thrust, looped, bombed):
+        # Action code of one update_ai frame, from what it did to the player.
+        # Thrust held at a limit counts as pushing against it.
+        if bombed:
+            return POLICY_BOMB
+        if looped:
+            return POLICY_LOOP
+        turn = 0 if abs(turn) < ROTATION_SPEED / 2 else 1 if turn > 0 else -1
+        if abs(thrust_change) < 1e-9:
+            thrust_change = 1 if thrust >= MAX_THRUST else -1 if thrust <= 0 else 0
+        thrust = 1 if thrust_change == 0 else 2 if thrust_change > 0 else 0
+        return (turn + 1) * 3 + thrust
+
+    def act(self, game, away, dist, current_time):
+        # Fly the table's action for this situation; False if it has none
+        action = self.table.get(self.situation(game, away, dist))
+        if action is None:
+            self.misses += 1
+            return False
+        self.hits += 1
+        player = game.player
+        if action == POLICY_BOMB:
+            game.detonate_bomb(current_time)
+        elif action == POLICY_LOOP:
+            player.start_loop(current_time)
+        else:
+            turn, thrust = divmod(action, 3)
+            player.angle += (turn - 1) * ROTATION_SPEED
+            if thrust == 0:
+                player.thrust = max(player.thrust - THRUST_ACCEL * 2, 0)
+            elif thrust == 2:
+                player.thrust = min(player.thrust + THRUST_ACCEL * 2, MAX_THRUST)
+        return True
 
 
 class Game:
-    def __init__(self):
-        self.screen = pygame.display.set_mode((WIDTH * SCALE, HEIGHT * SCALE))
-        pygame.display.set_caption("Retro Space Shooter")
-        self.clock = pygame.time.Clock()
+    def __init__(self, headless=False, clock=None, star_density=1.0, dirty_rects=False, record_path=None,
+                 rewind_seconds=None, ai_params=None, planner=None, policy=None,
+                 strategy_interval=1):
+        # Headless games never open a window and run on a simulated clock
+        self.headless = headless
+        if headless:
+            self.screen = pygame.Surface((WIDTH * SCALE, HEIGHT * SCALE))
+        else:
+            self.screen = pygame.display.set_mode((WIDTH * SCALE, HEIGHT * SCALE))
+            pygame.display.set_caption("Retro Space Shooter")
+        self.render_targets = RenderTargets(self.screen if headless else None)
+        # Optional dirty-rect path: only regions touched by moving entities
+        # are redrawn, scaled and pushed with display.update
+        self.dirty_rects = dirty_rects
+        self.dirty_tiles = DirtyTiles()
+        self.dirty_key = None
+        if clock is None:
+            clock = SimulatedClock() if headless else WallClock()
+        self.clock = clock
+        self.held_keys = collections.defaultdict(bool)
+
+        # Gameplay randomness comes from per-subsystem streams seeded by
+        # reset_game, so a game is reproduced by its seed and its input
+        self.streams = RandomStreams()
+        self.seed = 0
+        if record_path is not None and planner is not None:
+            raise ValueError("planner games depend on timing and can't be recorded")
+        self.record_path = record_path  # Each game's input is recorded here
+        self.recording = None  # Replay being recorded
+        self.replay = None  # Replay being played back
+        self.frame_keys = []  # Recorded KEYDOWN codes of the current frame
+
+        # Rewind history (hold R); off by default for headless simulation
+        if rewind_seconds is None:
+            rewind_seconds = 0 if headless else REWIND_SECONDS
+        self.rewind = RewindBuffer(rewind_seconds) if rewind_seconds else None
         self.game_font = pygame.font.Font(None, 40)
         self.info_font = pygame.font.Font(None, 24)
+        self.text_cache = TextCache()
+
+        # HUD is composited into its own layer, redrawn only when its values change
+        self.hud_layer = pygame.Surface((WIDTH, HUD_HEIGHT), pygame.SRCALPHA)
+        self.hud_state = None
+        self.hud_dirty = True
 
         # Background - scaled for larger world
-        self.stars = [[random.randint(0, WIDTH), random.randint(0, HEIGHT),
-                      random.choice([WHITE, GRAY])] for _ in range(150)]
-        self.dust = [[random.randint(0, WIDTH), random.randint(0, HEIGHT),
-                     random.choice([GRAY, BLUE])] for _ in range(75)]
+        self.star_layers = [
+            StarfieldLayer(int(STAR_COUNT * star_density), [WHITE, GRAY], 1, 1.0),
+            StarfieldLayer(int(DUST_COUNT * star_density), [GRAY, BLUE], 2, 0.5),
+        ]
         self.bg_offset = [0.0, 0.0]
 
         # Game state
         self.state = STATE_MENU
+        # Entity storage: bullets and particles live in preallocated arrays,
+        # enemies, asteroids and powerups are recycled through free-list pools
+        self.allocations = AllocationCounter()
+        self.enemy_pool = ObjectPool(Enemy, self.allocations)
+        self.asteroid_pool = ObjectPool(Asteroid, self.allocations)
+        self.powerup_pool = ObjectPool(PowerUp, self.allocations)
+
         self.player = None
-        self.bullets = []
+        self.bullets = BulletStore(allocations=self.allocations)
         self.enemies = []
-        self.enemy_bullets = []
+        self.enemy_bullets = BulletStore(allocations=self.allocations)
         self.asteroids = []
         self.powerups = []
-        self.explosions = []
-        self.engine_particles = []
+        self.explosions = ParticleSystem(allocations=self.allocations)  # Drawn in front of everything
+        self.engine_particles = ParticleSystem(allocations=self.allocations)  # Drawn behind everything
         self.boss = None
         self.boss_defeated_count = 0
 
+        # Collision broadphase grids (rebuilt every frame)
+        self.enemy_bullet_grid = SpatialHash()
+        self.enemy_grid = SpatialHash()
+        self.asteroid_grid = SpatialHash()
+
+        # Autopilot target queries (rebuilt every AI frame)
+        self.enemy_targets = TargetIndex('tier')
+        self.powerup_targets = TargetIndex('type')
+
+        # Danger field over the world, shown as an overlay with F2
+        self.influence = InfluenceMap()
+        self.influence_time = None  # Clock time of the last map update
+        self.show_influence = False
+
+        # Closest-approach forecast of every threat, for planned dodges
+        self.forecast = ThreatForecast()
+
+        # Main loop phase timings, shown as an overlay with F3
+        self.profiler = FrameProfiler()
+        self.show_profiler = False
+
+        # Optional maneuver source consulted before the reactive autopilot:
+        # a LookaheadPlanner, or a ManeuverScript inside a planner's rollouts
+        self.planner = planner
+
+        # Optional PolicyTable the autopilot looks its actions up in first
+        self.policy = policy
+
         self.score = 0
         self.stage = 1
         self.stage_transition_time = None
@@ -630,9 +2658,25 @@ class Game:
         self.last_shot_time = 0
         self.last_time_score_tick = 0
         self.game_over_time = None
+        self.death_cause = None
         self.ai_enabled = False
 
+        self.set_ai_params(ai_params)
+
+        # The autopilot's strategic step runs every strategy_interval of its
+        # frames; its decisions are cached in between
+        self.strategy_interval = strategy_interval
+        self.reset_ai_strategy()
+
+    def reset_ai_strategy(self):
+        self.ai_frames = 0
+        self.ai_target = None
+        self.ai_target_is_enemy = False
+        self.ai_target_due = True
+
     def load_high_score(self):
+        if self.headless:
+            return 0
         try:
             if os.path.exists('highscore.json'):
                 with open('highscore.json', 'r') as f:
@@ -643,6 +2687,8 @@ class Game:
         return 0
 
     def save_high_score(self):
+        if self.headless:
+            return
         try:
             with open('highscore.json', 'w') as f:
                 json.dump({'high_score': self.high_score}, f)
@@ -650,30 +2696,78 @@ class Game:
             pass
 
     def add_screen_shake(self, duration=SCREEN_SHAKE_DURATION):
-        self.screen_shake_until = pygame.time.get_ticks() + duration
+        self.screen_shake_until = self.clock.get_ticks() + duration
 
     def update_screen_shake(self):
-        current_time = pygame.time.get_ticks()
+        current_time = self.clock.get_ticks()
         if current_time < self.screen_shake_until:
-            self.shake_offset[0] = random.randint(-SCREEN_SHAKE_INTENSITY, SCREEN_SHAKE_INTENSITY)
-            self.shake_offset[1] = random.randint(-SCREEN_SHAKE_INTENSITY, SCREEN_SHAKE_INTENSITY)
+            self.shake_offset[0] = self.streams.fx.randint(-SCREEN_SHAKE_INTENSITY, SCREEN_SHAKE_INTENSITY)
+            self.shake_offset[1] = self.streams.fx.randint(-SCREEN_SHAKE_INTENSITY, SCREEN_SHAKE_INTENSITY)
         else:
             self.shake_offset = [0, 0]
 
     def create_explosion(self, x, y, color, size=1):
-        self.explosions.append(Explosion(x, y, color, particle_count=int(20 * size), size=size))
+        self.explosions.emit_explosion(x, y, color, particle_count=int(20 * size), size=size)
         self.add_screen_shake()
 
-    def reset_game(self):
+    def fly_maneuver(self, maneuver, current_time):
+        # One autopilot frame of a planner maneuver (see MANEUVERS)
+        player = self.player
+        if maneuver == 'left':
+            player.angle -= ROTATION_SPEED
+            player.thrust = MAX_THRUST
+        elif maneuver == 'right':
+            player.angle += ROTATION_SPEED
+            player.thrust = MAX_THRUST
+        elif maneuver == 'thrust':
+            player.thrust = MAX_THRUST
+        elif maneuver == 'brake':
+            player.thrust = max(player.thrust - THRUST_ACCEL * 2, 0)
+        elif maneuver == 'loop':
+            player.start_loop(current_time)
+        elif maneuver == 'bomb':
+            self.detonate_bomb(current_time)
+
+    def detonate_bomb(self, current_time):
+        if not self.player.use_bomb(current_time):
+            return False
+        # Bomb activated
+        self.bomb_flash_until = current_time + BOMB_FLASH_DURATION
+        self.add_screen_shake(400)
+        # Clear all enemies and bullets
+        for e in self.enemies:
+            self.create_explosion(e.pos[0], e.pos[1], Enemy.TIER_COLORS[e.tier - 1], size=2)
+            self.score += e.tier * 5
+        self.enemy_pool.release_all(self.enemies)
+        self.enemies.clear()
+        n = self.enemy_bullets.count
+        self.engine_particles.emit_burst(self.enemy_bullets.x[:n], self.enemy_bullets.y[:n], RED, 2, 2, size=2, lifetime=10)
+        self.enemy_bullets.clear()
+        # Damage boss
+        if self.boss:
+            self.engine_particles.emit_burst(self.boss.pos[0], self.boss.pos[1], PURPLE, 10, 3, size=4, lifetime=20)
+            self.boss.take_damage(50)  # Heavy damage to boss
+        return True
+
+    def reset_game(self, seed=None):
+        self.seed = random.randrange(1 << 32) if seed is None else seed
+        self.streams.seed(self.seed)
+        self.explosions.seed([self.seed, 0])
+        self.engine_particles.seed([self.seed, 1])
         self.player = Player(WIDTH / 2, HEIGHT / 2)
-        self.bullets = []
+        self.bullets.clear()
+        self.enemy_pool.release_all(self.enemies)
         self.enemies = []
-        self.enemy_bullets = []
+        self.enemy_bullets.clear()
+        self.asteroid_pool.release_all(self.asteroids)
         self.asteroids = []
+        self.powerup_pool.release_all(self.powerups)
         self.powerups = []
-        self.explosions = []
-        self.engine_particles = []
+        self.explosions.clear()
+        self.engine_particles.clear()
+        self.influence.clear()
         self.boss = None
+        self.boss_defeated_count = 0
         self.score = 0
         self.stage = 1
         self.stage_transition_time = None
@@ -682,156 +2776,224 @@ class Game:
         self.shake_offset = [0, 0]
         self.low_tier_enemy_destroyed = False
         self.last_shot_time = 0
-        self.last_time_score_tick = pygame.time.get_ticks()
+        self.last_time_score_tick = self.clock.get_ticks()
         self.game_over_time = None
+        self.death_cause = None
         self.bg_offset = [0.0, 0.0]
         self.ai_enabled = False
+        self.reset_ai_strategy()
         self.state = STATE_PLAYING
 
-    def update_ai(self):
-        current_time = pygame.time.get_ticks()
+        self.frame_keys.clear()
+        if self.rewind is not None:
+            self.rewind.clear()
+        if self.record_path is not None and self.replay is None:
+            self.stop_recording()
+            self.recording = Replay(self.seed, self.clock.get_ticks(), setup=self.autopilot_setup(),
+                                    strategy_interval=self.strategy_interval)
+
+    def set_ai_params(self, ai_params):
+        # Autopilot parameters: AI_PARAMS with any given overrides
+        self.ai_params = dict(AI_PARAMS)
+        if ai_params:
+            unknown = set(ai_params) - set(AI_PARAMS)
+            if unknown:
+                raise ValueError(f"unknown AI parameters: {', '.join(sorted(unknown))}")
+            self.ai_params.update(ai_params)
+
+    def autopilot_setup(self):
+        # Autopilot configuration a replay of this game has to be played with
+        return {'ai_params': self.ai_params,
+                'policy': self.policy.digest() if self.policy is not None else None}
+
+    def apply_autopilot_setup(self, setup):
+        # Fly the recorded parameters, and refuse a replay whose autopilot
+        # this game can't fly the same way
+        self.set_ai_params(setup['ai_params'])
+        recorded = setup.get('policy')
+        current = self.policy.digest() if self.policy is not None else None
+        if recorded != current:
+            raise ValueError(f"replay was recorded with policy table {recorded}, not {current}")
+
+    def gather_threats(self):
+        # Positions (n, 2) and threat weights of every enemy, asteroid, enemy
+        # bullet and the boss, in that order
+        params = self.ai_params
+        n_enemies = len(self.enemies)
+        first_bullet = n_enemies + len(self.asteroids)
+        end_bullet = first_bullet + self.enemy_bullets.count
+        pos = np.empty((end_bullet + (self.boss is not None), 2))
+        threat = np.empty(len(pos))
+        if first_bullet:
+            pos[:first_bullet] = [o.pos for o in self.enemies + self.asteroids]
+            threat[:n_enemies] = [params['enemy_threat'] * e.tier for e in self.enemies]
+            threat[n_enemies:first_bullet] = params['asteroid_threat']
+        pos[first_bullet:end_bullet, 0] = self.enemy_bullets.x[:self.enemy_bullets.count]
+        pos[first_bullet:end_bullet, 1] = self.enemy_bullets.y[:self.enemy_bullets.count]
+        threat[first_bullet:end_bullet] = params['bullet_threat']
+        if self.boss:
+            pos[-1] = self.boss.pos
+            threat[-1] = params['boss_threat']
+        return pos, threat
+
+    def threat_offsets(self, pos):
+        # Vectors from gather_threats() positions to the player, and their lengths
+        away = np.empty_like(pos)
+        away[:, 0] = self.player.pos[0] - pos[:, 0]
+        away[:, 1] = self.player.pos[1] - pos[:, 1]
+        return away, np.hypot(away[:, 0], away[:, 1])
+
+    def update_influence(self, pos, threat, current_time):
+        self.influence.update(pos[:, 0], pos[:, 1], threat, self.ai_params['perception_radius'])
+        self.influence_time = current_time
+
+    def choose_ai_target(self, hp_ratio):
+        # Smart targeting: prioritize powerups based on need. Returns the
+        # target (or None) and whether it is an enemy.
+        params = self.ai_params
+        player_x, player_y = self.player.pos
+        self.enemy_targets.build(self.enemies)
+        self.powerup_targets.build(self.powerups)
 
-        # Analyze situation
-        all_threats = []
-        nearby_bullets = 0
-        nearby_enemies = 0
+        # If low HP, prioritize health powerups
+        if hp_ratio <= 0.5 and self.powerups:
+            health = self.powerup_targets.nearest(player_x, player_y, PowerUp.TYPE_HEALTH)
+            if health is not None:
+                return health, False
 
-        for e in self.enemies:
-            dist = math.hypot(self.player.pos[0] - e.pos[0], self.player.pos[1] - e.pos[1])
-            all_threats.append({'pos': e.pos, 'threat': 6.0 * e.tier, 'dist': dist})
-            if dist < 100:  # Increased for larger world
-                nearby_enemies += 1
+        # If no shield, prioritize shield powerups
+        elif self.player.shield == 0 and self.powerups:
+            shield = self.powerup_targets.nearest(player_x, player_y, PowerUp.TYPE_SHIELD)
+            if shield is not None:
+                return shield, False
 
-        for a in self.asteroids:
-            dist = math.hypot(self.player.pos[0] - a.pos[0], self.player.pos[1] - a.pos[1])
-            all_threats.append({'pos': a.pos, 'threat': 3.0, 'dist': dist})
+        # Default: target enemies or nearest powerup
+        if self.enemies:
+            # Target weakest nearby enemy first, otherwise the nearest one
+            enemy = self.enemy_targets.weakest_within(player_x, player_y, params['target_radius'])
+            if enemy is None:
+                enemy = self.enemy_targets.nearest(player_x, player_y)
+            return enemy, True
+        if self.boss:
+            return self.boss, True
+        if self.powerups:
+            return self.powerup_targets.nearest(player_x, player_y), False
+        return None, False
 
-        for eb in self.enemy_bullets:
-            dist = math.hypot(self.player.pos[0] - eb.pos[0], self.player.pos[1] - eb.pos[1])
-            all_threats.append({'pos': eb.pos, 'threat': 25.0, 'dist': dist})
-            if dist < 80:  # Increased for larger world
-                nearby_bullets += 1
+    def update_ai(self):
+        current_time = self.clock.get_ticks()
+        params = self.ai_params
 
-        if self.boss:
-            dist = math.hypot(self.player.pos[0] - self.boss.pos[0], self.player.pos[1] - self.boss.pos[1])
-            all_threats.append({'pos': self.boss.pos, 'threat': 50.0, 'dist': dist})
+        if self.planner is not None:
+            maneuver = self.planner.maneuver(self)
+            if maneuver is not None:
+                self.fly_maneuver(maneuver, current_time)
+                return
 
-        # Decision making: Use bomb if overwhelmed
+        # Analyze situation. Every threat (enemies, asteroids, enemy bullets,
+        # then the boss) is one row of the away/threat/dist arrays; away
+        # points from the threat to the player.
+        pos, threat = self.gather_threats()
+        away, dist = self.threat_offsets(pos)
+        if self.policy is not None and self.policy.act(self, away, dist, current_time):
+            return
+        n_enemies = len(self.enemies)
+        first_bullet = n_enemies + len(self.asteroids)
+        end_bullet = first_bullet + self.enemy_bullets.count
         hp_ratio = self.player.hp / self.player.max_hp
-        danger_level = nearby_bullets * 2 + nearby_enemies
-
-        if self.player.bombs > 0 and not self.player.is_looping:
-            # Use bomb if: low HP + many threats OR too many bullets
-            should_bomb = (hp_ratio <= 0.33 and danger_level >= 4) or nearby_bullets >= 6
-            if should_bomb:
-                if self.player.use_bomb(current_time):
-                    self.bomb_flash_until = current_time + BOMB_FLASH_DURATION
-                    self.add_screen_shake(400)
-                    for e in self.enemies[:]:
-                        self.create_explosion(e.pos[0], e.pos[1], Enemy.TIER_COLORS[e.tier - 1], size=2)
-                        self.score += e.tier * 5
-                    self.enemies.clear()
-                    for eb in self.enemy_bullets[:]:
-                        for _ in range(2):
-                            vel_x = random.uniform(-2, 2)
-                            vel_y = random.uniform(-2, 2)
-                            self.engine_particles.append(Particle(eb.pos[0], eb.pos[1], vel_x, vel_y, RED, size=2, lifetime=10))
-                    self.enemy_bullets.clear()
-                    if self.boss:
-                        for _ in range(10):
-                            vel_x = random.uniform(-3, 3)
-                            vel_y = random.uniform(-3, 3)
-                            self.engine_particles.append(Particle(self.boss.pos[0], self.boss.pos[1], vel_x, vel_y, PURPLE, size=4, lifetime=20))
-                        self.boss.take_damage(50)
+        loop_ready = current_time - self.player.last_loop_time > LOOP_COOLDOWN
+
+        # Strategy (bomb and loop decisions, target choice) runs every
+        # strategy_interval autopilot frames; steering and dodging below run
+        # every frame, so emergency dodges are never delayed
+        strategic = self.ai_frames % self.strategy_interval == 0
+        self.ai_frames += 1
+        if strategic:
+            self.ai_target_due = True
+            nearby_enemies = int(np.count_nonzero(dist[:n_enemies] < params['nearby_enemy_radius']))
+            nearby_bullets = int(np.count_nonzero(dist[first_bullet:end_bullet] < params['nearby_bullet_radius']))
+
+            # Decision making: Use bomb if overwhelmed
+            danger_level = nearby_bullets * 2 + nearby_enemies
+
+            if self.player.bombs > 0 and not self.player.is_looping:
+                # Use bomb if: low HP + many threats OR too many bullets
+                should_bomb = ((hp_ratio <= params['bomb_hp_ratio'] and danger_level >= params['bomb_danger'])
+                               or nearby_bullets >= params['bomb_bullets'])
+                if should_bomb:
+                    if self.detonate_bomb(current_time):
+                        return
+
+            # Decision making: Use loop for emergency escape
+            if loop_ready and not self.player.is_looping:
+                # Use loop if surrounded or many bullets nearby
+                should_loop = danger_level >= params['loop_danger'] or nearby_bullets >= params['loop_bullets']
+                if should_loop:
+                    self.player.start_loop(current_time)
                     return
 
-        # Decision making: Use loop for emergency escape
-        loop_ready = current_time - self.player.last_loop_time > LOOP_COOLDOWN
-        if loop_ready and not self.player.is_looping:
-            # Use loop if surrounded or many bullets nearby
-            should_loop = danger_level >= 5 or nearby_bullets >= 4
-            if should_loop:
+        # Emergency dodge from the first threat inside the radius - use loop
+        # if available, otherwise dodge
+        emergency = np.flatnonzero(dist < params['emergency_dodge_radius'])
+        if emergency.size:
+            i = emergency[0]
+            if loop_ready and not self.player.is_looping and threat[i] >= params['loop_threat']:
                 self.player.start_loop(current_time)
                 return
 
-        # Emergency dodge - use loop if available, otherwise dodge
-        for t in all_threats:
-            if t['dist'] < EMERGENCY_DODGE_RADIUS:
-                if loop_ready and not self.player.is_looping and t['threat'] >= 20:
-                    self.player.start_loop(current_time)
-                    return
+            target_angle = math.degrees(math.atan2(away[i, 1], away[i, 0]))
+            angle_diff = (target_angle - self.player.angle + 180) % 360 - 180
+            turn_amount = min(ROTATION_SPEED, max(-ROTATION_SPEED, angle_diff))
+            self.player.angle += turn_amount
+            self.player.thrust = MAX_THRUST
+            return
 
-                repulsion_vec_x = self.player.pos[0] - t['pos'][0]
-                repulsion_vec_y = self.player.pos[1] - t['pos'][1]
-                target_angle = math.degrees(math.atan2(repulsion_vec_y, repulsion_vec_x))
+        # Planned dodge: sidestep the soonest enemy or bullet forecast to pass
+        # within the miss radius, away from where it will be at closest
+        # approach (asteroids don't hurt)
+        if params['predict_dodge_frames'] > 0:
+            forecast = self.forecast
+            forecast.predict(self.player, self.enemies, self.asteroids, self.enemy_bullets, current_time)
+            hit = (forecast.miss < params['predict_miss_radius']) & (forecast.time <= params['predict_dodge_frames'])
+            hit[n_enemies:first_bullet] = False
+            hits = np.flatnonzero(hit)
+            if hits.size:
+                i = hits[np.argmin(forecast.time[hits])]
+                offset = forecast.offset[i]
+                if abs(offset) < 1:
+                    # Dead on course: sidestep across the line of sight
+                    offset = complex(-away[i, 1], away[i, 0])
+                target_angle = math.degrees(cmath.phase(offset))
                 angle_diff = (target_angle - self.player.angle + 180) % 360 - 180
                 turn_amount = min(ROTATION_SPEED, max(-ROTATION_SPEED, angle_diff))
                 self.player.angle += turn_amount
                 self.player.thrust = MAX_THRUST
                 return
 
-        # General avoidance and targeting
-        steer_vec = [0.0, 0.0]
-        for t in all_threats:
-            if t['dist'] < PERCEPTION_RADIUS:
-                repulsion_vec_x = self.player.pos[0] - t['pos'][0]
-                repulsion_vec_y = self.player.pos[1] - t['pos'][1]
-                weight = t['threat'] / (t['dist']**2 + 1)
-                steer_vec[0] += repulsion_vec_x / (t['dist'] + 0.1) * weight
-                steer_vec[1] += repulsion_vec_y / (t['dist'] + 0.1) * weight
-
-        # Smart targeting: prioritize powerups based on need
-        target_pos = None
-        is_enemy_target = False
-
-        # If low HP, prioritize health powerups
-        if hp_ratio <= 0.5 and self.powerups:
-            health_powerups = [p for p in self.powerups if p.type == PowerUp.TYPE_HEALTH]
-            if health_powerups:
-                health_powerups.sort(key=lambda p: math.hypot(self.player.pos[0] - p.pos[0],
-                                                               self.player.pos[1] - p.pos[1]))
-                target_pos = health_powerups[0].pos
-
-        # If no shield, prioritize shield powerups
-        elif self.player.shield == 0 and self.powerups:
-            shield_powerups = [p for p in self.powerups if p.type == PowerUp.TYPE_SHIELD]
-            if shield_powerups:
-                shield_powerups.sort(key=lambda p: math.hypot(self.player.pos[0] - p.pos[0],
-                                                               self.player.pos[1] - p.pos[1]))
-                target_pos = shield_powerups[0].pos
-
-        # Default: target enemies or nearest powerup
-        if not target_pos:
-            if self.enemies or self.boss:
-                # Target weakest nearby enemy first
-                if self.enemies:
-                    nearby_enemies_list = [e for e in self.enemies if
-                                          math.hypot(self.player.pos[0] - e.pos[0],
-                                                    self.player.pos[1] - e.pos[1]) < 200]  # Increased for larger world
-                    if nearby_enemies_list:
-                        nearby_enemies_list.sort(key=lambda e: (e.tier, math.hypot(self.player.pos[0] - e.pos[0],
-                                                                                    self.player.pos[1] - e.pos[1])))
-                        target_pos = nearby_enemies_list[0].pos
-                        is_enemy_target = True
-                    else:
-                        self.enemies.sort(key=lambda e: math.hypot(self.player.pos[0] - e.pos[0],
-                                                                   self.player.pos[1] - e.pos[1]))
-                        target_pos = self.enemies[0].pos
-                        is_enemy_target = True
-                elif self.boss:
-                    target_pos = self.boss.pos
-                    is_enemy_target = True
-            elif self.powerups:
-                self.powerups.sort(key=lambda p: math.hypot(self.player.pos[0] - p.pos[0],
-                                                             self.player.pos[1] - p.pos[1]))
-                target_pos = self.powerups[0].pos
+        # General avoidance and targeting: threats in perception range push
+        # along their unit away vector with weight threat / (dist^2 + 1)
+        weight = threat / ((dist * dist + 1) * (dist + 0.1))
+        weight[dist >= params['perception_radius']] = 0
+        steer_vec = (weight @ away).tolist()
+
+        # Target: chosen on strategy frames, and again as soon as the cached
+        # one is gone. Pools recycle entities, so a cached target can come
+        # back as a different live one; that is still a fair target.
+        target = self.ai_target
+        if self.ai_target_due or (target is not None and target is not self.boss
+                                  and target not in self.enemies and target not in self.powerups):
+            self.ai_target, self.ai_target_is_enemy = self.choose_ai_target(hp_ratio)
+            self.ai_target_due = False
+        target = self.ai_target
+        target_pos = target.pos if target is not None else None
+        is_enemy_target = self.ai_target_is_enemy
 
         final_vec = list(steer_vec)
         steer_magnitude = math.hypot(steer_vec[0], steer_vec[1])
 
         if target_pos:
             # Adjust attraction based on health
-            attraction_weight = 0.3 if hp_ratio > 0.5 else 0.15
+            attraction_weight = params['attraction'] if hp_ratio > 0.5 else params['low_hp_attraction']
             if steer_magnitude > 1.0:
                 attraction_weight /= (steer_magnitude * 2)
             dx = target_pos[0] - self.player.pos[0]
@@ -854,7 +3016,7 @@ class Game:
             dist_to_target = math.hypot(self.player.pos[0] - target_pos[0],
                                        self.player.pos[1] - target_pos[1])
             # Better distance management for boss
-            optimal_dist = 150 if self.boss else 110  # Increased for larger world
+            optimal_dist = params['boss_optimal_dist'] if self.boss else params['optimal_dist']
             if dist_to_target > optimal_dist:
                 self.player.thrust = min(MAX_THRUST, self.player.thrust + THRUST_ACCEL)
             elif dist_to_target < optimal_dist - 30:
@@ -867,75 +3029,116 @@ class Game:
         else:
             self.player.thrust = max(0, self.player.thrust - THRUST_ACCEL)
 
+    def read_keys(self):
+        # Headless games have no keyboard and replays bring their own input;
+        # either way callers drive self.held_keys
+        if self.headless or self.replay is not None:
+            return self.held_keys
+        return pygame.key.get_pressed()
+
     def handle_events(self):
-        current_time = pygame.time.get_ticks()
+        current_time = self.clock.get_ticks()
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 return False
 
             if event.type == pygame.KEYDOWN:
-                # Help toggle (works in any state except playing)
-                if event.key == pygame.K_h:
-                    if self.state == STATE_MENU:
-                        self.state = STATE_HELP
-                    elif self.state == STATE_HELP:
-                        self.state = STATE_MENU
-                    elif self.state == STATE_PAUSED:
-                        self.state = STATE_HELP
-
-                if event.key == pygame.K_ESCAPE:
-                    if self.state == STATE_PLAYING:
-                        self.state = STATE_PAUSED
-                    elif self.state == STATE_PAUSED:
-                        self.state = STATE_PLAYING
-                    elif self.state == STATE_HELP:
-                        self.state = STATE_MENU
-                    elif self.state == STATE_MENU:
-                        return False
-
-                if self.state == STATE_MENU:
-                    if event.key == pygame.K_RETURN:
-                        self.reset_game()
-                    elif event.key == pygame.K_q:
-                        return False
-
-                if self.state == STATE_PLAYING:
-                    if event.key == pygame.K_a:
-                        self.ai_enabled = not self.ai_enabled
-                    if event.key == pygame.K_u:
-                        self.player.start_loop(current_time)
-                    if event.key == pygame.K_b:
-                        if self.player.use_bomb(current_time):
-                            # Bomb activated
-                            self.bomb_flash_until = current_time + BOMB_FLASH_DURATION
-                            self.add_screen_shake(400)
-                            # Clear all enemies and bullets
-                            for e in self.enemies[:]:
-                                self.create_explosion(e.pos[0], e.pos[1], Enemy.TIER_COLORS[e.tier - 1], size=2)
-                                self.score += e.tier * 5
-                            self.enemies.clear()
-                            for eb in self.enemy_bullets[:]:
-                                for _ in range(2):
-                                    vel_x = random.uniform(-2, 2)
-                                    vel_y = random.uniform(-2, 2)
-                                    self.engine_particles.append(Particle(eb.pos[0], eb.pos[1], vel_x, vel_y, RED, size=2, lifetime=10))
-                            self.enemy_bullets.clear()
-                            # Damage boss
-                            if self.boss:
-                                for _ in range(10):
-                                    vel_x = random.uniform(-3, 3)
-                                    vel_y = random.uniform(-3, 3)
-                                    self.engine_particles.append(Particle(self.boss.pos[0], self.boss.pos[1], vel_x, vel_y, PURPLE, size=4, lifetime=20))
-                                self.boss.take_damage(50)  # Heavy damage to boss
+                if not self.handle_key(event.key, current_time):
+                    return False
+
+        return True
+
+    def handle_key(self, key, current_time):
+        # Returns False when the key quits the game
+        if self.recording is not None and key in REPLAY_KEYS:
+            self.frame_keys.append(REPLAY_KEYS.index(key))
+
+        # Help toggle (works in any state except playing)
+        if key == pygame.K_h:
+            if self.state == STATE_MENU:
+                self.state = STATE_HELP
+            elif self.state == STATE_HELP:
+                self.state = STATE_MENU
+            elif self.state == STATE_PAUSED:
+                self.state = STATE_HELP
+
+        if key == pygame.K_ESCAPE:
+            if self.state == STATE_PLAYING:
+                self.state = STATE_PAUSED
+            elif self.state == STATE_PAUSED:
+                self.state = STATE_PLAYING
+            elif self.state == STATE_HELP:
+                self.state = STATE_MENU
+            elif self.state == STATE_MENU:
+                return False
+
+        if self.state == STATE_MENU:
+            if key == pygame.K_RETURN:
+                self.reset_game()
+            elif key == pygame.K_q:
+                return False
+
+        if key == pygame.K_F2:
+            self.show_influence = not self.show_influence
+        if key == pygame.K_F3:
+            self.show_profiler = not self.show_profiler
+            if self.show_profiler:
+                self.profiler.attach(self)
+            else:
+                self.profiler.detach(self)
+
+        if self.state == STATE_PLAYING:
+            if key == pygame.K_a:
+                self.ai_enabled = not self.ai_enabled
+            if key == pygame.K_u:
+                self.player.start_loop(current_time)
+            if key == pygame.K_b:
+                self.detonate_bomb(current_time)
 
         return True
 
+    def input_mask(self):
+        keys = self.read_keys()
+        mask = REPLAY_AI_BIT if self.ai_enabled else 0
+        for bit, key in enumerate(REPLAY_HELD_KEYS):
+            if keys[key]:
+                mask |= 1 << bit
+        return mask
+
+    def apply_input_mask(self, mask):
+        for bit, key in enumerate(REPLAY_HELD_KEYS):
+            self.held_keys[key] = bool(mask & (1 << bit))
+        self.ai_enabled = bool(mask & REPLAY_AI_BIT)
+
+    def record_frame(self):
+        # Called at the start of every update() while recording. The
+        # recording ends (and is saved) once the game leaves play.
+        if self.state == STATE_GAME_OVER or self.state == STATE_MENU:
+            self.stop_recording()
+            return
+        self.recording.add_frame(self.clock.get_ticks(), self.input_mask(), self.frame_keys)
+        self.frame_keys.clear()
+
+    def stop_recording(self):
+        if self.recording is not None:
+            self.recording.save(self.record_path)
+            self.recording = None
+
     def update(self):
+        if self.recording is not None:
+            self.record_frame()
         if self.state != STATE_PLAYING:
             return
 
-        current_time = pygame.time.get_ticks()
+        # Holding R scrubs backwards through the rewind history instead of playing.
+        # A recording can't express the jump, so rewind is off while recording
+        # (the HUD shows it) rather than ending the recording early.
+        if self.rewind is not None and self.recording is None and self.read_keys()[pygame.K_r]:
+            self.rewind.step_back(self)
+            return
+
+        current_time = self.clock.get_ticks()
 
         # Update screen shake
         self.update_screen_shake()
@@ -953,42 +3156,39 @@ class Game:
 
         # Update player
         self.player.update_loop(current_time)
-        keys = pygame.key.get_pressed()
+        keys = self.read_keys()
         move = self.player.update_movement(keys, self.ai_enabled, self.update_ai)
+        if self.show_influence and self.influence_time != current_time:
+            self.update_influence(*self.gather_threats(), current_time)
 
         if move:
             self.bg_offset[0] = (self.bg_offset[0] - move[0]) % WIDTH
             self.bg_offset[1] = (self.bg_offset[1] - move[1]) % HEIGHT
 
         # Create engine particles
-        if self.player.thrust > 0.5 and random.random() < 0.5:
-            rad = math.radians(self.player.angle + 180)
-            offset_dist = 10
-            particle_x = self.player.pos[0] + math.cos(rad) * offset_dist
-            particle_y = self.player.pos[1] + math.sin(rad) * offset_dist
-            vel_x = math.cos(rad) * self.player.thrust * 0.5 + random.uniform(-0.5, 0.5)
-            vel_y = math.sin(rad) * self.player.thrust * 0.5 + random.uniform(-0.5, 0.5)
-            color = random.choice([ORANGE, YELLOW, RED])
-            self.engine_particles.append(Particle(particle_x, particle_y, vel_x, vel_y, color, size=2, lifetime=15))
+        if self.player.thrust > 0.5:
+            self.engine_particles.emit_trail(self.player.pos[0], self.player.pos[1], self.player.angle,
+                                             self.player.thrust, (ORANGE, YELLOW, RED))
 
         # Auto-fire
         if not self.player.is_looping and current_time - self.last_shot_time > SHOOT_DELAY:
             self.last_shot_time = current_time
-            self.bullets.extend(self.player.shoot())
+            self.player.shoot(self.bullets)
 
         # Boss spawning
         boss_threshold = BOSS_SPAWN_SCORE * (self.boss_defeated_count + 1)
         if self.boss is None and self.score >= boss_threshold:
             self.boss = Boss()
             # Clear all enemies and bullets when boss spawns
+            self.enemy_pool.release_all(self.enemies)
             self.enemies.clear()
             self.enemy_bullets.clear()
 
         # Spawn enemies (only if no boss) - difficulty scales with stage
         enemy_spawn_rate = max(20, ENEMY_SPAWN_RATE - self.stage * 2)  # Gets faster each stage
-        if self.boss is None and random.randint(0, enemy_spawn_rate) == 0:
+        if self.boss is None and self.streams.spawn.randint(0, enemy_spawn_rate) == 0:
             if not self.low_tier_enemy_destroyed:
-                tier = random.choices([1, 2, 3], Enemy.LOW_TIER_PROBS)[0]
+                tier = self.streams.spawn.choices([1, 2, 3], Enemy.LOW_TIER_PROBS)[0]
             else:
                 # Higher stages increase chance of high-tier enemies
                 adjusted_probs = list(Enemy.TIER_SPAWN_PROBS)
@@ -1001,62 +3201,31 @@ class Game:
                 # Normalize
                 total = sum(adjusted_probs)
                 adjusted_probs = [p / total for p in adjusted_probs]
-                tier = random.choices([1, 2, 3, 4, 5, 6], adjusted_probs)[0]
-            self.enemies.append(Enemy(tier))
+                tier = self.streams.spawn.choices([1, 2, 3, 4, 5, 6], adjusted_probs)[0]
+            self.enemies.append(self.enemy_pool.acquire(tier, rng=self.streams.enemy))
 
         # Spawn asteroids (only if no boss) - more asteroids in higher stages
         asteroid_spawn_rate = max(30, 100 - self.stage * 5)
-        if self.boss is None and random.randint(0, asteroid_spawn_rate) == 0:
-            self.asteroids.append(Asteroid())
+        if self.boss is None and self.streams.spawn.randint(0, asteroid_spawn_rate) == 0:
+            self.asteroids.append(self.asteroid_pool.acquire(rng=self.streams.asteroid))
 
         # Update bullets
-        self.bullets = [b for b in self.bullets if b.update()]
+        self.bullets.update()
 
         # Update enemies
         for e in self.enemies[:]:
             dist = e.update(self.player.pos)
             if dist < 10:
-                is_dead = self.player.take_damage()
-                if is_dead:
-                    # Player explosion
-                    self.create_explosion(self.player.pos[0], self.player.pos[1], WHITE, size=2)
-                    self.state = STATE_GAME_OVER
-                    self.game_over_time = current_time
-                    if self.score > self.high_score:
-                        self.high_score = self.score
-                        self.save_high_score()
-                else:
-                    # Hit effect
-                    self.add_screen_shake(100)
-                    for _ in range(8):
-                        vel_x = random.uniform(-3, 3)
-                        vel_y = random.uniform(-3, 3)
-                        self.engine_particles.append(Particle(self.player.pos[0], self.player.pos[1], vel_x, vel_y, RED, size=2, lifetime=15))
+                self.damage_player(current_time, DEATH_ENEMY)
 
             if e.should_shoot():
-                self.enemy_bullets.append(e.shoot())
-
-        # Update enemy bullets
-        for eb in self.enemy_bullets[:]:
-            if not eb.update(self.player.pos):
-                self.enemy_bullets.remove(eb)
-            elif math.hypot(self.player.pos[0] - eb.pos[0], self.player.pos[1] - eb.pos[1]) < 5:
-                is_dead = self.player.take_damage()
-                if is_dead:
-                    # Player explosion
-                    self.create_explosion(self.player.pos[0], self.player.pos[1], WHITE, size=2)
-                    self.state = STATE_GAME_OVER
-                    self.game_over_time = current_time
-                    if self.score > self.high_score:
-                        self.high_score = self.score
-                        self.save_high_score()
-                else:
-                    # Hit effect
-                    self.add_screen_shake(100)
-                    for _ in range(8):
-                        vel_x = random.uniform(-3, 3)
-                        vel_y = random.uniform(-3, 3)
-                        self.engine_particles.append(Particle(self.player.pos[0], self.player.pos[1], vel_x, vel_y, RED, size=2, lifetime=15))
+                e.shoot(self.enemy_bullets, current_time)
+
+        # Update enemy bullets (homing, expiry and culling in one vectorized pass)
+        self.enemy_bullets.update(current_time, self.player.pos)
+        # Enemy bullets that reached the player (they are not consumed)
+        for _ in self.enemy_bullets.hits(self.player.pos, 5):
+            self.damage_player(current_time, DEATH_BULLET)
 
         # Update boss
         if self.boss:
@@ -1066,95 +3235,130 @@ class Game:
             dist_to_player = math.hypot(self.boss.pos[0] - self.player.pos[0],
                                        self.boss.pos[1] - self.player.pos[1])
             if dist_to_player < self.boss.size:
-                is_dead = self.player.take_damage()
-                if is_dead:
-                    self.create_explosion(self.player.pos[0], self.player.pos[1], WHITE, size=2)
-                    self.state = STATE_GAME_OVER
-                    self.game_over_time = current_time
-                    if self.score > self.high_score:
-                        self.high_score = self.score
-                        self.save_high_score()
-                else:
-                    self.add_screen_shake(100)
-                    for _ in range(8):
-                        vel_x = random.uniform(-3, 3)
-                        vel_y = random.uniform(-3, 3)
-                        self.engine_particles.append(Particle(self.player.pos[0], self.player.pos[1], vel_x, vel_y, RED, size=2, lifetime=15))
+                self.damage_player(current_time, DEATH_BOSS)
 
             # Boss shooting
             if self.boss.should_shoot():
-                boss_bullets = self.boss.shoot(self.player.pos)
-                self.enemy_bullets.extend(boss_bullets)
+                self.boss.shoot(self.player.pos, self.enemy_bullets, current_time)
 
         # Update asteroids
-        self.asteroids = [a for a in self.asteroids if a.update()]
+        surviving_asteroids = []
+        for a in self.asteroids:
+            if a.update():
+                surviving_asteroids.append(a)
+            else:
+                self.asteroid_pool.release(a)
+        self.asteroids = surviving_asteroids
 
         # Update powerups
         self.powerups = [p for p in self.powerups if p.update()]
 
         # Update particles and explosions
-        self.engine_particles = [p for p in self.engine_particles if p.update()]
-        self.explosions = [e for e in self.explosions if e.update()]
+        self.engine_particles.update()
+        self.explosions.update()
 
         # Handle collisions
         self.handle_collisions()
 
+        self.allocations.end_frame()
+        if self.rewind is not None and self.recording is None:
+            self.rewind.capture(self)
+
+    def damage_player(self, current_time, cause):
+        # cause (one of DEATH_CAUSES) is kept as death_cause if the hit is fatal
+        is_dead = self.player.take_damage(current_time)
+        if is_dead:
+            # Player explosion
+            self.create_explosion(self.player.pos[0], self.player.pos[1], WHITE, size=2)
+            self.state = STATE_GAME_OVER
+            self.game_over_time = current_time
+            self.death_cause = cause
+            if self.score > self.high_score:
+                self.high_score = self.score
+                self.save_high_score()
+        else:
+            # Hit effect
+            self.add_screen_shake(100)
+            self.engine_particles.emit_burst(self.player.pos[0], self.player.pos[1], RED, 8, 3, size=2, lifetime=15)
+
     def handle_collisions(self):
-        # Bullet vs Enemy Bullet
-        for b in self.bullets[:]:
-            for eb in self.enemy_bullets[:]:
-                if b in self.bullets and eb in self.enemy_bullets:
-                    if math.hypot(b.pos[0] - eb.pos[0], b.pos[1] - eb.pos[1]) < 4:
-                        self.bullets.remove(b)
-                        self.enemy_bullets.remove(eb)
-                        # Small spark effect
-                        for _ in range(3):
-                            vel_x = random.uniform(-2, 2)
-                            vel_y = random.uniform(-2, 2)
-                            self.engine_particles.append(Particle(b.pos[0], b.pos[1], vel_x, vel_y, WHITE, size=1, lifetime=10))
-                        break
-            if b not in self.bullets:
+        # Broadphase: rebuild the uniform grids for everything player bullets can hit.
+        # Candidates come back in list order and dead entries are flagged instead of
+        # removed, so hits resolve exactly as a full scan would.
+        enemy_bullets = self.enemy_bullets
+        eb_count = enemy_bullets.count
+        eb_x = enemy_bullets.x[:eb_count].tolist()
+        eb_y = enemy_bullets.y[:eb_count].tolist()
+        eb_alive = enemy_bullets.alive
+        eb_grid = self.enemy_bullet_grid
+        eb_grid.rebuild(enemy_bullets.x[:eb_count], enemy_bullets.y[:eb_count])
+        enemy_grid = self.enemy_grid
+        enemy_grid.rebuild(np.array([e.pos[0] for e in self.enemies]),
+                           np.array([e.pos[1] for e in self.enemies]))
+        asteroid_grid = self.asteroid_grid
+        asteroid_grid.rebuild(np.array([a.pos[0] for a in self.asteroids]),
+                              np.array([a.pos[1] for a in self.asteroids]))
+        max_asteroid_size = max((a.size for a in self.asteroids), default=0)
+
+        enemy_alive = [True] * len(self.enemies)
+        asteroid_alive = [True] * len(self.asteroids)
+        bullets = self.bullets
+        bullet_count = bullets.count
+
+        for b, (b_x, b_y) in enumerate(zip(bullets.x[:bullet_count].tolist(), bullets.y[:bullet_count].tolist())):
+            # Bullet vs Enemy Bullet
+            hit = False
+            for i in eb_grid.query(b_x, b_y, 4):
+                if not eb_alive[i]:
+                    continue
+                if math.hypot(b_x - eb_x[i], b_y - eb_y[i]) < 4:
+                    enemy_bullets.kill(i)
+                    bullets.kill(b)
+                    hit = True
+                    # Small spark effect
+                    self.engine_particles.emit_burst(b_x, b_y, WHITE, 3, 2, size=1, lifetime=10)
+                    break
+            if hit:
                 continue
 
             # Bullet vs Boss
             if self.boss:
-                if math.hypot(b.pos[0] - self.boss.pos[0], b.pos[1] - self.boss.pos[1]) < self.boss.size:
-                    if b in self.bullets:
-                        self.bullets.remove(b)
+                if math.hypot(b_x - self.boss.pos[0], b_y - self.boss.pos[1]) < self.boss.size:
+                    bullets.kill(b)
                     # Hit spark
-                    for _ in range(8):
-                        vel_x = random.uniform(-2, 2)
-                        vel_y = random.uniform(-2, 2)
-                        self.engine_particles.append(Particle(self.boss.pos[0], self.boss.pos[1], vel_x, vel_y, ORANGE, size=3, lifetime=15))
+                    self.engine_particles.emit_burst(self.boss.pos[0], self.boss.pos[1], ORANGE, 8, 2, size=3, lifetime=15)
 
                     if self.boss.take_damage():
                         # Boss defeated
                         self.score += 500
                         self.boss_defeated_count += 1
                         # Massive explosion
+                        fx = self.streams.fx
                         for i in range(5):
-                            offset_x = random.uniform(-20, 20)
-                            offset_y = random.uniform(-20, 20)
+                            offset_x = fx.uniform(-20, 20)
+                            offset_y = fx.uniform(-20, 20)
                             self.create_explosion(self.boss.pos[0] + offset_x, self.boss.pos[1] + offset_y,
-                                                random.choice([PURPLE, ORANGE, RED]), size=3)
+                                                fx.choice([PURPLE, ORANGE, RED]), size=3)
                         # Drop multiple powerups
+                        rng = self.streams.powerup
                         for _ in range(5):
-                            offset_x = random.uniform(-30, 30)
-                            offset_y = random.uniform(-30, 30)
-                            self.powerups.append(PowerUp(self.boss.pos[0] + offset_x, self.boss.pos[1] + offset_y))
+                            offset_x = rng.uniform(-30, 30)
+                            offset_y = rng.uniform(-30, 30)
+                            self.powerups.append(self.powerup_pool.acquire(self.boss.pos[0] + offset_x, self.boss.pos[1] + offset_y,
+                                                                           rng=rng))
                         self.boss = None
                     continue
 
             # Bullet vs Enemy
-            for e in self.enemies[:]:
-                if math.hypot(b.pos[0] - e.pos[0], b.pos[1] - e.pos[1]) < 10:
-                    if b in self.bullets:
-                        self.bullets.remove(b)
+            for i in enemy_grid.query(b_x, b_y, 10):
+                if not enemy_alive[i]:
+                    continue
+                e = self.enemies[i]
+                if math.hypot(b_x - e.pos[0], b_y - e.pos[1]) < 10:
+                    bullets.kill(b)
+                    hit = True
                     # Hit spark
-                    for _ in range(5):
-                        vel_x = random.uniform(-1, 1)
-                        vel_y = random.uniform(-1, 1)
-                        self.engine_particles.append(Particle(e.pos[0], e.pos[1], vel_x, vel_y, YELLOW, size=2, lifetime=12))
+                    self.engine_particles.emit_burst(e.pos[0], e.pos[1], YELLOW, 5, 1, size=2, lifetime=12)
 
                     if e.take_damage():
                         if e.tier < 4:
@@ -1163,34 +3367,43 @@ class Game:
                         # Create explosion based on enemy tier
                         explosion_color = Enemy.TIER_COLORS[e.tier - 1]
                         self.create_explosion(e.pos[0], e.pos[1], explosion_color, size=e.tier * 0.5)
-                        self.enemies.remove(e)
+                        enemy_alive[i] = False
                         # Higher tier enemies drop powerups more frequently
                         drop_chance = 0.15 + (e.tier * 0.05)  # 20% for tier 1, 45% for tier 6
-                        if random.random() < drop_chance:
-                            self.powerups.append(PowerUp(e.pos[0], e.pos[1]))
+                        if self.streams.powerup.random() < drop_chance:
+                            self.powerups.append(self.powerup_pool.acquire(e.pos[0], e.pos[1], rng=self.streams.powerup))
                     break
-
-            if b not in self.bullets:
+            if hit:
                 continue
 
             # Bullet vs Asteroid
-            for a in self.asteroids[:]:
-                if math.hypot(b.pos[0] - a.pos[0], b.pos[1] - a.pos[1]) < a.size:
-                    if a in self.asteroids:
-                        # Asteroid fragments
-                        for _ in range(a.size):
-                            vel_x = random.uniform(-2, 2)
-                            vel_y = random.uniform(-2, 2)
-                            self.engine_particles.append(Particle(a.pos[0], a.pos[1], vel_x, vel_y, GRAY, size=3, lifetime=20))
-                        self.asteroids.remove(a)
-                    if b in self.bullets:
-                        self.bullets.remove(b)
-                    if random.random() < 0.12:  # Slightly reduced from 0.15
-                        self.powerups.append(PowerUp(a.pos[0], a.pos[1]))
+            for i in asteroid_grid.query(b_x, b_y, max_asteroid_size):
+                if not asteroid_alive[i]:
+                    continue
+                a = self.asteroids[i]
+                if math.hypot(b_x - a.pos[0], b_y - a.pos[1]) < a.size:
+                    bullets.kill(b)
+                    hit = True
+                    # Asteroid fragments
+                    self.engine_particles.emit_burst(a.pos[0], a.pos[1], GRAY, a.size, 2, size=3, lifetime=20)
+                    asteroid_alive[i] = False
+                    if self.streams.powerup.random() < 0.12:  # Slightly reduced from 0.15
+                        self.powerups.append(self.powerup_pool.acquire(a.pos[0], a.pos[1], rng=self.streams.powerup))
                     break
 
+        # Drop everything that was hit in one pass (keeps list order)
+        bullets.compact()
+        enemy_bullets.compact()
+        if not all(enemy_alive):
+            self.enemy_pool.release_all([e for e, alive in zip(self.enemies, enemy_alive) if not alive])
+            self.enemies = [e for e, alive in zip(self.enemies, enemy_alive) if alive]
+        if not all(asteroid_alive):
+            self.asteroid_pool.release_all([a for a, alive in zip(self.asteroids, asteroid_alive) if not alive])
+            self.asteroids = [a for a, alive in zip(self.asteroids, asteroid_alive) if alive]
+
         # Player vs PowerUp
-        for p in self.powerups[:]:
+        remaining_powerups = []
+        for p in self.powerups:
             if math.hypot(p.pos[0] - self.player.pos[0], p.pos[1] - self.player.pos[1]) < 10:
                 if p.type == PowerUp.TYPE_WEAPON:
                     self.player.upgrade_weapon()
@@ -1200,28 +3413,80 @@ class Game:
                     self.player.add_shield()
                 elif p.type == PowerUp.TYPE_BOMB:
                     self.player.add_bomb()
-                self.powerups.remove(p)
+                self.powerup_pool.release(p)
+            else:
+                remaining_powerups.append(p)
+        self.powerups = remaining_powerups
+
+    def plan_dirty_rects(self, current_time, flash):
+        # Mark where everything is drawn this frame and return the regions to
+        # redraw, or None when the whole frame has to be redrawn
+        tiles = self.dirty_tiles
+        r = self.player.sprites.radius + 1
+        x, y = self.player.pos
+        tiles.mark_box(x - r, y - r, x + r + 1, y + r + 1)
+        n = self.bullets.count
+        tiles.mark_squares(self.bullets.x[:n], self.bullets.y[:n], 3)
+        n = self.enemy_bullets.count
+        tiles.mark_squares(self.enemy_bullets.x[:n], self.enemy_bullets.y[:n], 2)
+        half = ENEMY_SPRITE_SIZE // 2 + 1
+        for e in self.enemies:
+            tiles.mark_box(e.pos[0] - half, e.pos[1] - half, e.pos[0] + half + 1, e.pos[1] + half + 1)
+        for a in self.asteroids:
+            r = a.size + 1
+            tiles.mark_box(a.pos[0] - r, a.pos[1] - r, a.pos[0] + r + 1, a.pos[1] + r + 1)
+        for p in self.powerups:
+            tiles.mark_box(p.pos[0] - 3, p.pos[1] - 3, p.pos[0] + 4, p.pos[1] + 4)
+        if self.boss:
+            r = self.boss.size + 1
+            tiles.mark_box(self.boss.pos[0] - r, self.boss.pos[1] - r, self.boss.pos[0] + r + 1, self.boss.pos[1] + r + 1)
+            tiles.mark_box(20, 10, WIDTH - 20, 18)  # Health bar
+        for particles in (self.engine_particles, self.explosions):
+            n = particles.count
+            tiles.mark_squares(particles.x[:n], particles.y[:n], particles.extent())
+        if self.hud_dirty:
+            tiles.mark_box(0, 0, WIDTH, HUD_HEIGHT)
+
+        # Shake, bomb flash, scrolling, text overlays and the influence map
+        # and profiler overlays change every pixel, and so does the first frame after any
+        # of them ends
+        key = (self.state, tuple(self.bg_offset), tuple(self.shake_offset), flash, self.stage_transition_time,
+               self.show_influence, self.show_profiler)
+        full = (key != self.dirty_key or self.state != STATE_PLAYING or flash or self.show_influence or
+                self.show_profiler or
+                current_time < self.screen_shake_until or self.stage_transition_time is not None or
+                tiles.fraction() > DIRTY_FULL_RATIO)
+        self.dirty_key = key
+        rects = None if full else tiles.rects()
+        tiles.end_frame()
+        return rects
 
     def draw(self):
-        low_res = pygame.Surface((WIDTH, HEIGHT))
+        current_time = self.clock.get_ticks()
+        flash = current_time < self.bomb_flash_until
+        rects = None
+        in_game = self.state == STATE_PLAYING or self.state == STATE_PAUSED
+        if in_game:
+            self.refresh_hud()
+        if in_game and self.dirty_rects:
+            rects = self.plan_dirty_rects(current_time, flash)
+        else:
+            self.dirty_key = None  # Force a full redraw when the path resumes
 
         # Bomb flash effect
-        current_time = pygame.time.get_ticks()
-        if current_time < self.bomb_flash_until:
-            low_res.fill(WHITE)
-        else:
-            low_res.fill(BLACK)
+        low_res = self.render_targets.begin(WHITE if flash else BLACK, rects)
+        rects = self.render_targets.rects  # None when the whole frame is redrawn
 
         # Draw background
-        for s in self.stars:
-            x = (s[0] + self.bg_offset[0] + self.shake_offset[0]) % WIDTH
-            y = (s[1] + self.bg_offset[1] + self.shake_offset[1]) % HEIGHT
-            pygame.draw.rect(low_res, s[2], (x, y, 1, 1))
-
-        for d in self.dust:
-            x = (d[0] + self.bg_offset[0] * 0.5 + self.shake_offset[0]) % WIDTH
-            y = (d[1] + self.bg_offset[1] * 0.5 + self.shake_offset[1]) % HEIGHT
-            pygame.draw.rect(low_res, d[2], (x, y, 2, 2))
+        if rects is None:
+            for layer in self.star_layers:
+                layer.draw(low_res, self.bg_offset, self.shake_offset)
+        else:
+            for r in rects:
+                low_res.set_clip(r)
+                for layer in self.star_layers:
+                    layer.draw(low_res, self.bg_offset, self.shake_offset)
+            low_res.set_clip(None)
 
         if self.state == STATE_MENU:
             self.draw_menu(low_res)
@@ -1229,17 +3494,14 @@ class Game:
             self.draw_help(low_res)
         elif self.state == STATE_PLAYING or self.state == STATE_PAUSED:
             # Draw particles (behind everything)
-            for p in self.engine_particles:
-                p.draw(low_res)
+            self.engine_particles.draw(low_res)
 
             # Draw game objects
-            self.player.draw(low_res)
-            for b in self.bullets:
-                b.draw(low_res)
+            self.player.draw(low_res, current_time)
+            self.bullets.draw(low_res, 3, WHITE)
             for e in self.enemies:
                 e.draw(low_res)
-            for eb in self.enemy_bullets:
-                eb.draw(low_res)
+            self.enemy_bullets.draw(low_res, 2, RED)
             for a in self.asteroids:
                 a.draw(low_res)
             for p in self.powerups:
@@ -1250,11 +3512,13 @@ class Game:
                 self.boss.draw(low_res)
 
             # Draw explosions (in front of everything)
-            for exp in self.explosions:
-                exp.draw(low_res)
+            self.explosions.draw(low_res)
+
+            if self.show_influence:
+                self.influence.draw(low_res)
 
             # Draw HUD
-            self.draw_hud(low_res)
+            self.draw_hud(low_res, rects)
 
             # Draw boss health bar
             if self.boss:
@@ -1271,51 +3535,56 @@ class Game:
                     else:
                         alpha_ratio = alpha_ratio * 2
 
-                    stage_notify = self.game_font.render(f"STAGE {self.stage}", True, CYAN)
+                    stage_notify = self.text_cache.render(self.game_font, f"STAGE {self.stage}", CYAN)
                     notify_rect = stage_notify.get_rect(center=(WIDTH/2, HEIGHT/2))
                     low_res.blit(stage_notify, notify_rect)
                 else:
                     self.stage_transition_time = None
 
             if self.state == STATE_PAUSED:
-                pause_text = self.game_font.render("PAUSED", True, YELLOW)
+                pause_text = self.text_cache.render(self.game_font, "PAUSED", YELLOW)
                 text_rect = pause_text.get_rect(center=(WIDTH/2, HEIGHT/2))
                 low_res.blit(pause_text, text_rect)
+                if self.rewind is not None:
+                    report = "Rewind off while recording" if self.recording is not None else self.rewind.report()
+                    rewind_text = self.text_cache.render(self.info_font, report, GRAY)
+                    low_res.blit(rewind_text, rewind_text.get_rect(center=(WIDTH/2, HEIGHT/2 + 25)))
 
         elif self.state == STATE_GAME_OVER:
             self.draw_game_over(low_res)
 
             # Auto-restart
-            current_time = pygame.time.get_ticks()
             if self.game_over_time and current_time - self.game_over_time > RESTART_DELAY:
                 self.state = STATE_MENU
 
-        pygame.transform.scale(low_res, (WIDTH * SCALE, HEIGHT * SCALE), self.screen)
-        pygame.display.flip()
+        if self.show_profiler:
+            self.profiler.draw(low_res, self)
+
+        self.render_targets.present(flip=not self.headless)
 
     def draw_menu(self, surface):
-        title = self.game_font.render("SPACE SHOOTER", True, CYAN)
+        title = self.text_cache.render(self.game_font, "SPACE SHOOTER", CYAN)
         title_rect = title.get_rect(center=(WIDTH/2, HEIGHT/3))
         surface.blit(title, title_rect)
 
-        start_text = self.info_font.render("Press ENTER to Start", True, WHITE)
+        start_text = self.text_cache.render(self.info_font, "Press ENTER to Start", WHITE)
         start_rect = start_text.get_rect(center=(WIDTH/2, HEIGHT/2))
         surface.blit(start_text, start_rect)
 
-        high_score_text = self.info_font.render(f"High Score: {self.high_score}", True, YELLOW)
+        high_score_text = self.text_cache.render(self.info_font, f"High Score: {self.high_score}", YELLOW)
         hs_rect = high_score_text.get_rect(center=(WIDTH/2, HEIGHT/2 + 30))
         surface.blit(high_score_text, hs_rect)
 
-        help_text = self.info_font.render("Press H for Help", True, GREEN)
+        help_text = self.text_cache.render(self.info_font, "Press H for Help", GREEN)
         help_rect = help_text.get_rect(center=(WIDTH/2, HEIGHT/2 + 50))
         surface.blit(help_text, help_rect)
 
-        quit_text = self.info_font.render("Press Q to Quit", True, GRAY)
+        quit_text = self.text_cache.render(self.info_font, "Press Q to Quit", GRAY)
         quit_rect = quit_text.get_rect(center=(WIDTH/2, HEIGHT - 30))
         surface.blit(quit_text, quit_rect)
 
     def draw_help(self, surface):
-        title = self.game_font.render("CONTROLS", True, CYAN)
+        title = self.text_cache.render(self.game_font, "CONTROLS", CYAN)
         title_rect = title.get_rect(center=(WIDTH/2, 15))
         surface.blit(title, title_rect)
 
@@ -1330,7 +3599,7 @@ class Game:
             ("  -Prioritizes survival", GREEN),
             ("U: Loop (Special Move)", PURPLE),
             ("B: Bomb (Clear Screen)", ORANGE),
-            ("ESC: Pause Game", GRAY),
+            ("ESC: Pause Game  R (hold): Rewind", GRAY),
             ("", BLACK),
             ("POWERUPS:", CYAN),
             ("Yellow: Weapon Upgrade", YELLOW),
@@ -1346,24 +3615,49 @@ class Game:
 
         for text, color in controls:
             if text:
-                line = self.info_font.render(text, True, color)
+                line = self.text_cache.render(self.info_font, text, color)
                 surface.blit(line, (10, y_offset))
             y_offset += line_height
 
-        back_text = self.info_font.render("Press H or ESC to go back", True, GRAY)
+        back_text = self.text_cache.render(self.info_font, "Press H or ESC to go back", GRAY)
         back_rect = back_text.get_rect(center=(WIDTH/2, HEIGHT - 10))
         surface.blit(back_text, back_rect)
 
-    def draw_hud(self, surface):
+    def refresh_hud(self):
+        # Recompose the HUD layer only when one of its values changed
+        current_time = self.clock.get_ticks()
+        loop_ready = current_time - self.player.last_loop_time > LOOP_COOLDOWN
+        hud_state = (self.score, self.stage, self.player.hp, self.player.max_hp, self.player.shield,
+                     self.player.max_shield, self.player.weapon_level, self.player.bombs,
+                     loop_ready, self.ai_enabled, self.recording is not None)
+        self.hud_dirty = hud_state != self.hud_state
+        if self.hud_dirty:
+            self.hud_state = hud_state
+            self.hud_layer.fill((0, 0, 0, 0))
+            self.compose_hud(self.hud_layer, loop_ready)
+
+    def draw_hud(self, surface, rects=None):
+        if rects is None:
+            surface.blit(self.hud_layer, (0, 0))
+            return
+        # Partial frames only touch the dirty regions: blending the
+        # translucent HUD edges over themselves again would smear them
+        hud_rect = self.hud_layer.get_rect()
+        for r in rects:
+            area = r.clip(hud_rect)
+            if area:
+                surface.blit(self.hud_layer, area.topleft, area)
+
+    def compose_hud(self, surface, loop_ready):
         # Score and Stage
-        score_text = self.info_font.render(f"Score: {self.score}", True, WHITE)
+        score_text = self.text_cache.render(self.info_font, f"Score: {self.score}", WHITE)
         surface.blit(score_text, (WIDTH - 95, 5))
 
-        stage_text = self.info_font.render(f"Stage {self.stage}", True, CYAN)
+        stage_text = self.text_cache.render(self.info_font, f"Stage {self.stage}", CYAN)
         surface.blit(stage_text, (WIDTH - 85, 25))
 
         # Health bar
-        hp_text = self.info_font.render("HP:", True, WHITE)
+        hp_text = self.text_cache.render(self.info_font, "HP:", WHITE)
         surface.blit(hp_text, (5, 5))
         for i in range(self.player.max_hp):
             color = GREEN if i < self.player.hp else GRAY
@@ -1371,63 +3665,278 @@ class Game:
 
         # Shield bar
         if self.player.max_shield > 0:
-            shield_text = self.info_font.render("SH:", True, WHITE)
+            shield_text = self.text_cache.render(self.info_font, "SH:", WHITE)
             surface.blit(shield_text, (5, 20))
             for i in range(self.player.max_shield):
                 color = CYAN if i < self.player.shield else GRAY
                 pygame.draw.rect(surface, color, (35 + i * 12, 23, 10, 10))
 
         # Weapon level
-        weapon_text = self.info_font.render(f"Weapon: Lv.{self.player.weapon_level}", True, YELLOW)
+        weapon_text = self.text_cache.render(self.info_font, f"Weapon: Lv.{self.player.weapon_level}", YELLOW)
         surface.blit(weapon_text, (5, 38))
 
         # Bombs
-        bomb_text = self.info_font.render(f"Bombs[B]: {self.player.bombs}", True, ORANGE)
+        bomb_text = self.text_cache.render(self.info_font, f"Bombs[B]: {self.player.bombs}", ORANGE)
         surface.blit(bomb_text, (5, 53))
 
         # Loop cooldown
-        current_time = pygame.time.get_ticks()
-        loop_ready = current_time - self.player.last_loop_time > LOOP_COOLDOWN
         loop_color = GREEN if loop_ready else GRAY
-        loop_text = self.info_font.render("Loop[U]", True, loop_color)
+        loop_text = self.text_cache.render(self.info_font, "Loop[U]", loop_color)
         surface.blit(loop_text, (5, 68))
 
-        # AI indicator
+        # AI indicator; a distilled table flies worse than update_ai, so say so
         if self.ai_enabled:
-            ai_text = self.info_font.render("AI ON", True, GREEN)
-            surface.blit(ai_text, (WIDTH - 50, 45))
+            label = "AI ON" if self.policy is None else "AI TABLE"
+            ai_text = self.text_cache.render(self.info_font, label, GREEN)
+            surface.blit(ai_text, (WIDTH - ai_text.get_width() - 5, 45))
+
+        # Recording indicator; rewind is off while recording
+        if self.recording is not None:
+            rec_text = self.text_cache.render(self.info_font, "REC (no rewind)", RED)
+            surface.blit(rec_text, (WIDTH - rec_text.get_width() - 5, 65))
 
     def draw_game_over(self, surface):
-        game_over_text = self.game_font.render("GAME OVER", True, RED)
+        game_over_text = self.text_cache.render(self.game_font, "GAME OVER", RED)
         text_rect = game_over_text.get_rect(center=(WIDTH/2, HEIGHT/2 - 20))
         surface.blit(game_over_text, text_rect)
 
-        score_text = self.info_font.render(f"Score: {self.score}", True, WHITE)
+        score_text = self.text_cache.render(self.info_font, f"Score: {self.score}", WHITE)
         score_rect = score_text.get_rect(center=(WIDTH/2, HEIGHT/2 + 10))
         surface.blit(score_text, score_rect)
 
         if self.score >= self.high_score:
-            new_high_text = self.info_font.render("NEW HIGH SCORE!", True, YELLOW)
+            new_high_text = self.text_cache.render(self.info_font, "NEW HIGH SCORE!", YELLOW)
             nh_rect = new_high_text.get_rect(center=(WIDTH/2, HEIGHT/2 + 30))
             surface.blit(new_high_text, nh_rect)
 
+    def snapshot(self):
+        # Complete game state as compact bytes, for restore(). Caches, pools,
+        # the renderer and the high score are not part of it.
+        p = self.player
+        parts = [SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, STATES.index(self.state),
+            0 if self.death_cause is None else DEATH_CAUSES.index(self.death_cause) + 1, self.ai_enabled,
+            self.low_tier_enemy_destroyed, p is not None, self.score, self.stage, self.boss_defeated_count,
+            self.seed, -1 if self.stage_transition_time is None else self.stage_transition_time,
+            self.bomb_flash_until, self.screen_shake_until, self.last_shot_time, self.last_time_score_tick,
+            -1 if self.game_over_time is None else self.game_over_time,
+            self.shake_offset[0], self.shake_offset[1], self.bg_offset[0], self.bg_offset[1],
+            self.clock.get_ticks(), self.clock.frame,
+            len(self.enemies), len(self.asteroids), len(self.powerups))]
+        if p is not None:
+            parts.append(PLAYER_STATE.pack(
+                p.pos[0], p.pos[1], p.angle, p.thrust, p.weapon_level, p.hp, p.max_hp, p.shield,
+                p.max_shield, p.bombs, p.max_bombs, p.invincible_until, p.last_loop_time, p.is_looping,
+                p.loop_start_time, p.loop_start_pos[0], p.loop_start_pos[1], p.loop_start_angle))
+        b = self.boss
+        parts.append(struct.pack('<?', b is not None))
+        if b is not None:
+            parts.append(BOSS_STATE.pack(b.pos[0], b.pos[1], b.hp, b.max_hp, b.speed, b.size,
+                                         b.direction, b.attack_timer, b.attack_pattern, b.phase))
+        parts.append(np.array([(e.tier, e.hp, e.speed, e.pos[0], e.pos[1], e.angle) for e in self.enemies],
+                              dtype=ENEMY_STATE).tobytes())
+        parts.append(np.array([(a.size, a.pos[0], a.pos[1], a.vel[0], a.vel[1]) for a in self.asteroids],
+                              dtype=ASTEROID_STATE).tobytes())
+        parts.append(np.array([(PowerUp.TYPES.index(u.type), u.pos[0], u.pos[1], u.vel[0], u.vel[1])
+                               for u in self.powerups], dtype=POWERUP_STATE).tobytes())
+        parts.append(self.streams.pack())
+        for store in (self.bullets, self.enemy_bullets, self.explosions, self.engine_particles):
+            parts.append(store.pack())
+        parts.append(self.pack_ai_strategy())
+        return b''.join(parts)
+
+    def pack_ai_strategy(self):
+        # The autopilot's strategy phase and cached target, as a kind and a
+        # list index. A target that has left every list is replaced on the
+        # next autopilot frame anyway, so it is saved as a due re-choice.
+        target = self.ai_target
+        kind, index, due = AI_TARGET_NONE, -1, self.ai_target_due
+        if target is not None:
+            if target is self.boss:
+                kind = AI_TARGET_BOSS
+            elif target in self.enemies:
+                kind, index = AI_TARGET_ENEMY, self.enemies.index(target)
+            elif target in self.powerups:
+                kind, index = AI_TARGET_POWERUP, self.powerups.index(target)
+            else:
+                due = True
+        return AI_STATE.pack(self.ai_frames, kind, index, self.ai_target_is_enemy, due)
+
+    def unpack_ai_strategy(self, data, offset):
+        self.ai_frames, kind, index, self.ai_target_is_enemy, self.ai_target_due = AI_STATE.unpack_from(data, offset)
+        target = None
+        if kind == AI_TARGET_BOSS:
+            target = self.boss
+        elif kind == AI_TARGET_ENEMY:
+            target = self.enemies[index]
+        elif kind == AI_TARGET_POWERUP:
+            target = self.powerups[index]
+        self.ai_target = target
+        return offset + AI_STATE.size
+
+    def restore(self, data):
+        # Inverse of snapshot(); the clock carries on from the saved time
+        (magic, version, state, death_cause, self.ai_enabled, self.low_tier_enemy_destroyed, has_player,
+         self.score, self.stage, self.boss_defeated_count, self.seed, stage_transition_time,
+         self.bomb_flash_until, self.screen_shake_until, self.last_shot_time, self.last_time_score_tick,
+         game_over_time, shake_x, shake_y, bg_x, bg_y, ticks, frame,
+         enemies, asteroids, powerups) = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"not a version {SNAPSHOT_VERSION} snapshot")
+        offset = SNAPSHOT_HEADER.size
+        self.state = STATES[state]
+        self.death_cause = DEATH_CAUSES[death_cause - 1] if death_cause else None
+        self.stage_transition_time = None if stage_transition_time < 0 else stage_transition_time
+        self.game_over_time = None if game_over_time < 0 else game_over_time
+        self.shake_offset = [shake_x, shake_y]
+        self.bg_offset = [bg_x, bg_y]
+        self.clock.restore(ticks, frame)
+
+        if has_player:
+            if self.player is None:
+                self.player = Player(WIDTH / 2, HEIGHT / 2)
+            p = self.player
+            (p.pos[0], p.pos[1], p.angle, p.thrust, p.weapon_level, p.hp, p.max_hp, p.shield,
+             p.max_shield, p.bombs, p.max_bombs, p.invincible_until, p.last_loop_time, p.is_looping,
+             p.loop_start_time, p.loop_start_pos[0], p.loop_start_pos[1], p.loop_start_angle) = PLAYER_STATE.unpack_from(data, offset)
+            offset += PLAYER_STATE.size
+        else:
+            self.player = None
+
+        has_boss, = struct.unpack_from('<?', data, offset)
+        offset += 1
+        self.boss = None
+        if has_boss:
+            b = self.boss = Boss()
+            (b.pos[0], b.pos[1], b.hp, b.max_hp, b.speed, b.size, b.direction, b.attack_timer,
+             b.attack_pattern, b.phase) = BOSS_STATE.unpack_from(data, offset)
+            offset += BOSS_STATE.size
+
+        self.enemy_pool.release_all(self.enemies)
+        self.enemies = []
+        for row in np.frombuffer(data, ENEMY_STATE, enemies, offset).tolist():
+            e = self.enemy_pool.acquire_blank()
+            e.tier, e.hp, e.speed, e.pos[0], e.pos[1], e.angle = row
+            e.rng = self.streams.enemy
+            self.enemies.append(e)
+        offset += enemies * ENEMY_STATE.itemsize
+        self.asteroid_pool.release_all(self.asteroids)
+        self.asteroids = []
+        for row in np.frombuffer(data, ASTEROID_STATE, asteroids, offset).tolist():
+            a = self.asteroid_pool.acquire_blank()
+            a.size, a.pos[0], a.pos[1], a.vel[0], a.vel[1] = row
+            self.asteroids.append(a)
+        offset += asteroids * ASTEROID_STATE.itemsize
+        self.powerup_pool.release_all(self.powerups)
+        self.powerups = []
+        for power_type, x, y, vel_x, vel_y in np.frombuffer(data, POWERUP_STATE, powerups, offset).tolist():
+            u = self.powerup_pool.acquire_blank()
+            u.type = PowerUp.TYPES[power_type]
+            u.pos[:] = x, y
+            u.vel[:] = vel_x, vel_y
+            self.powerups.append(u)
+        offset += powerups * POWERUP_STATE.itemsize
+
+        offset = self.streams.unpack(data, offset)
+        for store in (self.bullets, self.enemy_bullets, self.explosions, self.engine_particles):
+            offset = store.unpack(data, offset)
+        self.unpack_ai_strategy(data, offset)
+
+        # Derived render state is rebuilt on the next draw, and a recording
+        # cannot express the jump, so it ends here
+        self.hud_state = None
+        self.dirty_key = None
+        self.frame_keys.clear()
+        self.stop_recording()
+
+    def step(self):
+        # Advance exactly one frame of game time (no events, no rendering)
+        self.update()
+        self.clock.tick(FPS)
+
+    def run_headless(self, max_frames=None, ai_enabled=True, seed=None):
+        # Play one game without a window as fast as possible.
+        # Returns the number of frames simulated.
+        self.reset_game(seed)
+        self.ai_enabled = ai_enabled
+        frames = 0
+        while self.state == STATE_PLAYING and (max_frames is None or frames < max_frames):
+            self.step()
+            frames += 1
+        self.stop_recording()
+        return frames
+
+    def play_replay(self, replay, render=False):
+        # Re-run a recorded game frame-exact from its seed and input. Without
+        # rendering it runs as fast as possible; with rendering it keeps the
+        # recorded pace. Returns the number of frames played.
+        self.apply_autopilot_setup(replay.setup)
+        self.strategy_interval = replay.strategy_interval  # reset_game restarts the strategy phase
+        self.clock = ReplayClock(replay, realtime=render)
+        self.replay = replay
+        self.reset_game(replay.seed)
+        frames = 0
+        for _, mask, codes in replay.frames:
+            if render and pygame.event.peek(pygame.QUIT):
+                break
+            current_time = self.clock.get_ticks()
+            for code in codes:
+                self.handle_key(REPLAY_KEYS[code], current_time)
+            self.apply_input_mask(mask)
+            self.update()
+            if render:
+                pygame.event.pump()
+                self.draw()
+            self.clock.tick(FPS)
+            frames += 1
+        self.replay = None
+        return frames
+
+    def profiled_frame(self):
+        # One iteration of run() with its phases timed for the F3 overlay
+        profiler = self.profiler
+        profiler.begin()
+        running = self.handle_events()
+        profiler.mark('events')
+        self.update()
+        profiler.mark('entities')
+        self.draw()
+        profiler.mark('compose')
+        self.clock.tick(FPS)
+        profiler.mark('idle')
+        profiler.end_frame(self.render_targets.timings)
+        return running
+
     async def run(self):
         """Main game loop - async for Pygbag web support"""
         running = True
         while running:
-            running = self.handle_events()
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
+            if self.show_profiler:
+                running = self.profiled_frame()
+            else:
+                running = self.handle_events()
+                self.update()
+                self.draw()
+                self.clock.tick(FPS)
             await asyncio.sleep(0)  # Critical for Pygbag - yields to browser
 
+        self.stop_recording()
         pygame.quit()
         sys.exit()
 
 
 async def main():
     """Entry point for async execution"""
-    game = Game()
+    # A distill_policy.py table bundled next to this file lets the autopilot
+    # fly by lookup, which is cheaper on slow browsers but scores less, so
+    # only tables distilled with --web are used
+    policy = None
+    policy_path = os.path.join(ASSET_DIR, POLICY_FILE)
+    if os.path.exists(policy_path):
+        policy = PolicyTable.load(policy_path)
+        if not policy.web:
+            policy = None
+    game = Game(policy=policy)
     await game.run()
 
 
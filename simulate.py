@@ -0,0 +1,128 @@
+"""Run many headless AI-pilot games in parallel and report the results.
+
+Usage: python simulate.py [--games N] [--frames N] [--seed S] [--workers N]
+                          [--ai-profile FILE] [--planner] [--policy FILE]
+                          [--strategy-interval N] [--json FILE] [--csv FILE]
+"""
+import argparse
+import collections
+import concurrent.futures
+import csv
+import json
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from game0 import FPS, DEATH_CAUSES, Game, LookaheadPlanner, PolicyTable, load_ai_profile  # noqa: E402
+
+SURVIVED = "survived"  # Death cause of games that reached the frame limit
+FIELDS = ('seed', 'score', 'stage', 'bosses', 'death_cause', 'frames', 'seconds', 'fps')
+
+
+def play(seed, max_frames, ai_params=None, planner=False, policy=None, strategy_interval=1):
+    # A fresh Game (clock at zero) per seed, so results don't depend on
+    # which games a worker happened to run before. The planner runs
+    # without a time budget, so its games are reproducible too. policy is
+    # the path of a PolicyTable.
+    planner = LookaheadPlanner(budget_ms=None) if planner else None
+    game = Game(headless=True, ai_params=ai_params, planner=planner,
+                policy=PolicyTable.load(policy) if policy else None, strategy_interval=strategy_interval)
+    start = time.perf_counter()
+    try:
+        frames = game.run_headless(max_frames, ai_enabled=True, seed=seed)
+    finally:
+        if planner is not None:
+            planner.close()
+    seconds = time.perf_counter() - start
+    return {
+        'seed': seed,
+        'score': game.score,
+        'stage': game.stage,
+        'bosses': game.boss_defeated_count,
+        'death_cause': game.death_cause or SURVIVED,
+        'frames': frames,
+        'seconds': round(seconds, 3),
+        'fps': round(frames / seconds, 1) if seconds else 0.0,
+    }
+
+
+def summarize(results, wall_seconds):
+    scores = [r['score'] for r in results]
+    stages = [r['stage'] for r in results]
+    frames = sum(r['frames'] for r in results)
+    deaths = collections.Counter(r['death_cause'] for r in results)
+    return {
+        'games': len(results),
+        'score': {
+            'mean': round(statistics.mean(scores), 1),
+            'median': statistics.median(scores),
+            'min': min(scores),
+            'max': max(scores),
+        },
+        'stage': {
+            'mean': round(statistics.mean(stages), 2),
+            'max': max(stages),
+            'reached': dict(sorted(collections.Counter(stages).items())),
+        },
+        'bosses': {
+            'total': sum(r['bosses'] for r in results),
+            'mean': round(statistics.mean(r['bosses'] for r in results), 2),
+        },
+        'deaths': {cause: deaths[cause] for cause in DEATH_CAUSES + (SURVIVED,)},
+        'frames': frames,
+        'game_minutes': round(frames / FPS / 60, 1),
+        'wall_seconds': round(wall_seconds, 2),
+        'fps': {
+            'per_game': round(statistics.mean(r['fps'] for r in results), 1),
+            'total': round(frames / wall_seconds, 1) if wall_seconds else 0.0,
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--games', type=int, default=32)
+    parser.add_argument('--frames', type=int, default=FPS * 60 * 10, help='frame limit per game (default 10 game-minutes)')
+    parser.add_argument('--seed', type=int, default=0, help='game i uses seed SEED + i')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: one per CPU)')
+    parser.add_argument('--ai-profile', metavar='FILE', help='autopilot parameters written by tune_ai.py')
+    parser.add_argument('--planner', action='store_true', help='autopilot plans maneuvers by lookahead rollouts')
+    parser.add_argument('--policy', metavar='FILE', help='autopilot looks actions up in a distill_policy.py table')
+    parser.add_argument('--strategy-interval', type=int, default=1, metavar='N',
+                        help="autopilot's target, bomb and loop choices every N frames")
+    parser.add_argument('--json', metavar='FILE', help='write the summary and every game to FILE')
+    parser.add_argument('--csv', metavar='FILE', help='write one row per game to FILE')
+    args = parser.parse_args()
+
+    seeds = [args.seed + i for i in range(args.games)]
+    ai_params = load_ai_profile(args.ai_profile) if args.ai_profile else None
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+        results = list(pool.map(play, seeds, [args.frames] * len(seeds), [ai_params] * len(seeds),
+                                [args.planner] * len(seeds), [args.policy] * len(seeds),
+                                [args.strategy_interval] * len(seeds)))
+    summary = summarize(results, time.perf_counter() - start)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'frame_limit': args.frames, 'summary': summary, 'games': results}, f, indent=2)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.DictWriter(f, FIELDS)
+            writer.writeheader()
+            writer.writerows(results)
+
+    score, stage = summary['score'], summary['stage']
+    print(f"{summary['games']} games, {summary['game_minutes']} game-minutes in {summary['wall_seconds']} s "
+          f"({summary['fps']['total']:.0f} frames/s, {summary['fps']['per_game']:.0f} per game)")
+    print(f"score  mean {score['mean']}  median {score['median']}  min {score['min']}  max {score['max']}")
+    print(f"stage  mean {stage['mean']}  max {stage['max']}  bosses defeated {summary['bosses']['total']}")
+    print("deaths " + "  ".join(f"{cause} {count}" for cause, count in summary['deaths'].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Tune the autopilot's AI_PARAMS with an evolution strategy.
+
+Each generation samples candidate parameter sets around the current mean and
+scores every candidate by its mean score over the same batch of headless
+games, played across a process pool. The better half of the candidates,
+rank-weighted, sets the next mean and per-parameter step sizes (a separable,
+diagonal-covariance variant of CMA-ES without evolution paths). Progress is checkpointed after every generation, so an
+interrupted run resumes where it stopped, and the best set found so far is
+always written as a profile that `game0.py --ai-profile` and
+`simulate.py --ai-profile` load.
+
+Usage: python tune_ai.py [--generations N] [--population N] [--games N]
+                         [--frames N] [--seed S] [--workers N]
+                         [--checkpoint FILE] [--out FILE] [--fresh]
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from game0 import AI_PARAMS, FPS  # noqa: E402
+from simulate import play  # noqa: E402
+
+# Search range of every parameter; candidates are sampled in [0, 1] and
+# scaled into these bounds
+PARAM_SPACE = {
+    'enemy_threat': (1.0, 20.0),
+    'asteroid_threat': (0.0, 15.0),
+    'bullet_threat': (5.0, 80.0),
+    'boss_threat': (10.0, 150.0),
+    'emergency_dodge_radius': (20.0, 90.0),
+    'perception_radius': (60.0, 260.0),
+    'nearby_enemy_radius': (40.0, 200.0),
+    'nearby_bullet_radius': (30.0, 160.0),
+    'bomb_hp_ratio': (0.0, 1.0),
+    'bomb_danger': (1.0, 12.0),
+    'bomb_bullets': (2.0, 15.0),
+    'loop_danger': (1.0, 12.0),
+    'loop_bullets': (1.0, 10.0),
+    'loop_threat': (3.0, 60.0),
+    'target_radius': (80.0, 400.0),
+    'optimal_dist': (50.0, 220.0),
+    'boss_optimal_dist': (60.0, 260.0),
+    'attraction': (0.02, 1.0),
+    'low_hp_attraction': (0.02, 1.0),
+    'predict_dodge_frames': (0.0, 20.0),
+    'predict_miss_radius': (4.0, 40.0),
+}
+NAMES = tuple(PARAM_SPACE)
+LOW = np.array([PARAM_SPACE[name][0] for name in NAMES])
+HIGH = np.array([PARAM_SPACE[name][1] for name in NAMES])
+
+SIGMA_START = 0.15  # Initial step size, as a fraction of each range
+SIGMA_MIN = 0.01
+SIGMA_RATE = 0.3  # How fast step sizes follow the spread of the best candidates
+
+
+def to_params(x):
+    return {name: round(float(v), 4) for name, v in zip(NAMES, LOW + x * (HIGH - LOW))}
+
+
+def from_params(params):
+    return np.clip((np.array([params[name] for name in NAMES]) - LOW) / (HIGH - LOW), 0, 1)
+
+
+def score(params, seed, max_frames):
+    return play(seed, max_frames, params)['score']
+
+
+def new_state(args):
+    return {
+        'generation': 0,
+        'seed': args.seed,
+        'mean': from_params(AI_PARAMS).tolist(),
+        'sigma': [SIGMA_START] * len(NAMES),
+        'best': None,
+        'history': [],
+    }
+
+
+def save_json(path, data):
+    # Write-then-rename, so an interrupted run never leaves a torn file
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def evolve(state, args, pool):
+    generation = state['generation']
+    rng = np.random.default_rng([state['seed'], generation])
+    mean = np.array(state['mean'])
+    sigma = np.array(state['sigma'])
+
+    # Candidate 0 is the mean itself, so every generation re-measures it
+    candidates = np.clip(mean + sigma * rng.standard_normal((args.population, len(NAMES))), 0, 1)
+    candidates[0] = mean
+    seeds = rng.integers(1 << 32, size=args.games).tolist()  # Shared by all candidates
+
+    params = [to_params(x) for x in candidates]
+    tasks = [(p, seed) for p in params for seed in seeds]
+    scores = list(pool.map(score, [p for p, _ in tasks], [seed for _, seed in tasks],
+                           [args.frames] * len(tasks), chunksize=max(1, len(tasks) // (4 * args.workers))))
+    fitness = np.array(scores, dtype=float).reshape(args.population, args.games).mean(axis=1)
+
+    # Log-rank weighted recombination of the better half
+    mu = args.population // 2
+    order = np.argsort(-fitness)[:mu]
+    weights = np.log(mu + 0.5) - np.log(np.arange(1, mu + 1))
+    weights /= weights.sum()
+    elite = candidates[order]
+    spread = np.sqrt(weights @ (elite - mean) ** 2)
+    state['mean'] = (weights @ elite).tolist()
+    state['sigma'] = np.maximum(SIGMA_MIN, (1 - SIGMA_RATE) * sigma + SIGMA_RATE * spread).tolist()
+
+    top = int(order[0])
+    if state['best'] is None or fitness[top] > state['best']['fitness']:
+        state['best'] = {'params': params[top], 'fitness': round(float(fitness[top]), 2), 'generation': generation}
+    state['history'].append({
+        'generation': generation,
+        'best': round(float(fitness[top]), 2),
+        'median': round(float(np.median(fitness)), 2),
+        'mean_candidate': round(float(fitness[0]), 2),
+        'sigma': round(float(np.mean(state['sigma'])), 4),
+    })
+    state['generation'] = generation + 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--generations', type=int, default=30, help='stop after this many generations in total')
+    parser.add_argument('--population', type=int, default=16, help='candidates per generation')
+    parser.add_argument('--games', type=int, default=8, help='games per candidate')
+    parser.add_argument('--frames', type=int, default=FPS * 60 * 5, help='frame limit per game (default 5 game-minutes)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='processes (default: one per CPU)')
+    parser.add_argument('--checkpoint', metavar='FILE', default='tune_ai.checkpoint.json')
+    parser.add_argument('--out', metavar='FILE', default='ai_profile.json', help='profile with the best parameters')
+    parser.add_argument('--fresh', action='store_true', help='ignore an existing checkpoint')
+    args = parser.parse_args()
+
+    if os.path.exists(args.checkpoint) and not args.fresh:
+        with open(args.checkpoint) as f:
+            state = json.load(f)
+        print(f"Resuming {args.checkpoint} at generation {state['generation']}")
+    else:
+        state = new_state(args)
+
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+        while state['generation'] < args.generations:
+            start = time.perf_counter()
+            evolve(state, args, pool)
+            save_json(args.checkpoint, state)
+            best = state['best']
+            save_json(args.out, {
+                'params': best['params'],
+                'fitness': best['fitness'],
+                'generation': best['generation'],
+                'games': args.games,
+                'frames': args.frames,
+            })
+            last = state['history'][-1]
+            print(f"gen {last['generation']:3d}  best {last['best']:8.1f}  median {last['median']:8.1f}  "
+                  f"mean candidate {last['mean_candidate']:8.1f}  sigma {last['sigma']:.3f}  "
+                  f"overall best {best['fitness']:.1f}  ({time.perf_counter() - start:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()